@@ -0,0 +1,855 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the movie catalog hot paths.
+Run after process_imdb.py so data/movies.bin exists, or with --synthetic
+to run on a generated dataset of that many IMDb titles instead (see
+synthetic_data.py), which needs no real data or network access.
+
+--json writes every measurement to a file for tracking, and --compare
+reports the measurements that got worse than in such a file, exiting
+with status 1 if any did.
+
+Usage: python benchmark.py [search] [cast] [topk] [suggest] [catalog] [memory] [recommend] [reviews] [users]
+                           [download] [ingest] [process] [load] [dashboard] [save_review] [--repeat N]
+                           [--synthetic TITLES [--users N]] [--json FILE] [--compare FILE [--tolerance FRACTION]]
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import gc
+import gzip
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import OrderedDict
+
+from IMDBDownloader import IMDBDownloader
+from main import app
+from mock_imdb_server import MockIMDBServer
+from movie_catalog import MovieCatalog
+from movie_index import MovieIndex, weighted_rating
+from movies import Movies
+from recommender import Recommender
+from review import Review
+from review_store import ReviewStore
+import synthetic_data
+from text_search import normalize_name
+from title_suggester import TitleSuggester
+from user import User
+from user_store import UserStore
+
+MAX_RESULTS = 50
+
+# Every measurement of this run as {'benchmark', 'metric', 'value', 'unit'}, for --json
+RESULTS = []
+# Units where a bigger value is better; for the rest smaller is better
+HIGHER_IS_BETTER = ('writes/s', 'movies/s')
+# Units that describe the workload rather than measure it, ignored by --compare
+INFO_UNITS = ('count', 'MB on disk')
+_running = None
+
+
+def record(metric, value, unit):
+    """Keep a measurement of the running benchmark for --json and --compare."""
+    RESULTS.append({'benchmark': _running, 'metric': metric, 'value': value, 'unit': unit})
+
+
+# Filter mixes sent to the /search route
+SEARCH_QUERIES = [
+    {},
+    {'genre': 'Drama'},
+    {'genre': 'Comedy', 'rating': '7'},
+    {'year': '1999'},
+    {'title': 'the'},
+    {'title': 'star', 'genre': 'Action'},
+    {'title': 'lo'},
+    {'cast': 'smith'},
+    {'title': 'night', 'year': '2001', 'rating': '6.5'},
+]
+
+# Multi-filter queries that include a cast member
+CAST_QUERIES = [
+    {'cast': 'smith'},
+    {'cast': 'smith', 'genre': 'Drama'},
+    {'cast': 'john', 'year': '1999'},
+    {'cast': 'ann', 'rating': '7'},
+    {'cast': 'lee', 'title': 'the', 'genre': 'Action'},
+    {'cast': 'an', 'genre': 'Comedy', 'rating': '6'},
+]
+
+
+def scan_search(movies, title='', genre='', year='', cast='', rating='', limit=None):
+    """The original linear-scan /search filter, kept as the benchmark baseline.
+
+    Cast names are accent-folded like the index does, so both return the
+    same movies.
+    """
+    cast = normalize_name(cast)
+    results = []
+    for movie in movies:
+        if title and title not in movie.title.lower():
+            continue
+        if genre and genre not in movie.genres:
+            continue
+        if year:
+            try:
+                if movie.year != int(year):
+                    continue
+            except (ValueError, TypeError):
+                pass
+        if rating:
+            try:
+                rating_float = float(rating)
+                if movie.rating is None or movie.rating < rating_float:
+                    continue
+            except (ValueError, TypeError):
+                pass
+        if cast and not any(cast in normalize_name(name) for name in movie.cast):
+            continue
+        results.append(movie)
+    results.sort(key=weighted_rating, reverse=True)
+    return results[:limit]
+
+
+def timed(func, repeat):
+    """Run func repeat times and return (result, best seconds per call)."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def bench_search(repeat):
+    """Compare the linear scan with MovieIndex on the search filter mixes."""
+    movies = Movies.get_cached_movies()
+    start = time.perf_counter()
+    index = MovieIndex(movies)
+    print(f"Indexed {len(index)} movies in {time.perf_counter() - start:.2f}s")
+    record('index build', time.perf_counter() - start, 's')
+
+    print(f"{'query':<50} {'scan ms':>9} {'index ms':>9} {'speedup':>8}")
+    for query in SEARCH_QUERIES:
+        expected, scan_time = timed(lambda: scan_search(movies, limit=MAX_RESULTS, **query), repeat)
+        actual, index_time = timed(lambda: index.search(limit=MAX_RESULTS, **query), repeat)
+        if [m.id for m in expected] != [m.id for m in actual]:
+            print(f"  MISMATCH for {query}")
+        print(f"{str(query):<50} {scan_time * 1000:>9.2f} {index_time * 1000:>9.2f} "
+              f"{scan_time / max(index_time, 1e-9):>7.1f}x")
+        record(f"{query} scan", scan_time * 1000, 'ms')
+        record(f"{query} index", index_time * 1000, 'ms')
+
+
+def bench_cast(repeat):
+    """Compare the linear scan with the person index on multi-filter queries that include cast."""
+    movies = Movies.get_cached_movies()
+    start = time.perf_counter()
+    index = MovieIndex(movies)
+    print(f"Indexed {len(index)} movies and {len(index.people)} people in {time.perf_counter() - start:.2f}s")
+
+    print(f"{'query':<50} {'scan ms':>9} {'index ms':>9} {'speedup':>8}")
+    for query in CAST_QUERIES:
+        expected, scan_time = timed(lambda: scan_search(movies, limit=MAX_RESULTS, **query), repeat)
+        actual, index_time = timed(lambda: index.search(limit=MAX_RESULTS, **query), repeat)
+        if [m.id for m in expected] != [m.id for m in actual]:
+            print(f"  MISMATCH for {query}")
+        print(f"{str(query):<50} {scan_time * 1000:>9.2f} {index_time * 1000:>9.2f} "
+              f"{scan_time / max(index_time, 1e-9):>7.1f}x")
+        record(f"{query} scan", scan_time * 1000, 'ms')
+        record(f"{query} index", index_time * 1000, 'ms')
+
+    names = [name for movie in random.Random(0).sample(movies, min(len(movies), 200)) for name in movie.cast]
+    _, scan_time = timed(lambda: [[m for m in movies if name in m.cast] for name in names], 1)
+    _, index_time = timed(lambda: [index.movies_with_person(name) for name in names], repeat)
+    print(f"{'exact name lookup (per name)':<50} {scan_time * 1000 / len(names):>9.2f} "
+          f"{index_time * 1000 / len(names):>9.2f} {scan_time / max(index_time, 1e-9):>7.1f}x")
+    record('exact name lookup index', index_time * 1000 / len(names), 'ms')
+
+
+def bench_topk(repeat):
+    """Compare sorting every match with top-K selection on broad queries."""
+    movies = Movies.get_cached_movies()
+    index = MovieIndex(movies)
+    queries = [{}] + [{'genre': genre} for genre in Movies.get_genres()] + [{'title': 'the'}, {'title': 'a'}]
+
+    print(f"{'query':<30} {'matches':>8} {'sort ms':>9} {'top-k ms':>9} {'speedup':>8}")
+    for query in queries:
+        matches = index.search(**query)
+        expected, sort_time = timed(
+            lambda: sorted(matches, key=weighted_rating, reverse=True)[:MAX_RESULTS], repeat)
+        actual, topk_time = timed(lambda: index.search(limit=MAX_RESULTS, **query), repeat)
+        if [m.id for m in expected] != [m.id for m in actual]:
+            print(f"  MISMATCH for {query}")
+        print(f"{str(query):<30} {len(matches):>8} {sort_time * 1000:>9.2f} {topk_time * 1000:>9.2f} "
+              f"{sort_time / max(topk_time, 1e-9):>7.1f}x")
+        record(f"{query} top-k", topk_time * 1000, 'ms')
+
+
+SUGGEST_BUDGET_MS = 5
+
+
+def _typo(text, rng):
+    """Swap two neighbouring letters of text, like a fast typist would."""
+    if len(text) < 2:
+        return text
+    i = rng.randrange(len(text) - 1)
+    return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+
+
+def bench_suggest(repeat):
+    """Measure /api/suggest latency for every keystroke of sampled titles, with and without typos."""
+    movies = Movies.get_cached_movies()
+    start = time.perf_counter()
+    suggester = TitleSuggester(movies)
+    print(f"Built title suggester for {len(movies)} movies in {time.perf_counter() - start:.2f}s")
+    record('build', time.perf_counter() - start, 's')
+
+    rng = random.Random(0)
+    titles = [movie.title for movie in rng.sample(movies, min(len(movies), 100 * repeat)) if movie.title]
+    for name, queries in (('prefix', titles), ('typo', [_typo(title, rng) for title in titles])):
+        latencies = []
+        for query in queries:
+            for end in range(1, len(query) + 1):
+                start = time.perf_counter()
+                suggester.suggest(query[:end])
+                latencies.append((time.perf_counter() - start) * 1000)
+        p50, p99 = percentile(latencies, 0.5), percentile(latencies, 0.99)
+        status = "within" if p99 <= SUGGEST_BUDGET_MS else "OVER"
+        print(f"{name:<8} {len(latencies)} keystrokes: p50 {p50:.3f} ms, p99 {p99:.3f} ms "
+              f"({status} the {SUGGEST_BUDGET_MS} ms budget)")
+        record(f"{name} p50", p50, 'ms')
+        record(f"{name} p99", p99, 'ms')
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB."""
+    # VmHWM is reset by exec, unlike ru_maxrss which a spawned child inherits
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _measure_load(catalog_file, movies_file):
+    """Load the catalog in this (fresh) process and return (seconds, peak RSS growth in MB)."""
+    Movies.CATALOG_FILE = catalog_file
+    Movies.MOVIES_FILE = movies_file
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    movies = Movies.get_all_movies()
+    elapsed = time.perf_counter() - start
+    assert movies
+    return elapsed, peak_rss_mb() - rss_before
+
+
+def bench_catalog(repeat):
+    """Compare cold-start loading of movies.json with the columnar catalog."""
+    records = Movies.load_movie_records()
+    if not records:
+        print("No saved movies, run process_imdb.py first")
+        return
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        json_file = Movies.MOVIES_FILE
+        if not os.path.exists(json_file):
+            json_file = os.path.join(temp_dir, 'movies.json')
+            with open(json_file, 'w', encoding='utf-8') as f:
+                json.dump(records, f, indent=4, ensure_ascii=False)
+        catalog_file = os.path.join(temp_dir, 'movies.bin')
+        MovieCatalog.write(catalog_file, records)
+        missing_file = os.path.join(temp_dir, 'missing')
+
+        print(f"{len(records)} movies: movies.json {os.path.getsize(json_file) / 2 ** 20:.1f} MB, "
+              f"movies.bin {os.path.getsize(catalog_file) / 2 ** 20:.1f} MB")
+        print(f"{'format':<10} {'load s':>8} {'RSS MB':>8}")
+        # Each load runs in a fresh interpreter so startup and peak RSS are not shared
+        context = multiprocessing.get_context('spawn')
+        for name, files in (('json', (missing_file, json_file)), ('catalog', (catalog_file, missing_file))):
+            runs = []
+            for _ in range(repeat):
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                    runs.append(pool.submit(_measure_load, *files).result())
+            print(f"{name:<10} {min(r[0] for r in runs):>8.2f} {min(r[1] for r in runs):>8.1f}")
+            record(f"{name} load", min(r[0] for r in runs), 's')
+            record(f"{name} peak RSS", min(r[1] for r in runs), 'MB')
+
+
+class DictMovie:
+    """The original Movies representation: a __dict__ and one list per field."""
+
+    def __init__(self, movie_id, data):
+        self.id = movie_id
+        self.title = data.get("title")
+        self.year = data.get("year")
+        self.genres = data.get("genres")
+        self.runtime = data.get("runtime")
+        self.rating = data.get("rating")
+        self.votes = data.get("votes")
+        self.cast = data["cast"]["actor"] + data["cast"]["actress"]
+        self.directors = data["cast"]["director"]
+
+
+def _traced_bytes(load):
+    """Return the memory still allocated by the objects load() returns."""
+    gc.collect()
+    tracemalloc.start()
+    result = load()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def bench_memory(repeat):
+    """Compare the memory held per movie by the dict-based and table-backed Movies."""
+    records = Movies.load_movie_records()
+    if not records:
+        print("No saved movies, run process_imdb.py first")
+        return
+    encoded = json.dumps(records)
+    del records
+
+    # Both variants start from the JSON text so they pay for their own strings
+    dict_bytes = _traced_bytes(lambda: [DictMovie(movie_id, data) for movie_id, data in json.loads(encoded).items()])
+    table_bytes = _traced_bytes(Movies.get_all_movies)
+    count = len(Movies.get_all_movies())
+
+    print(f"{'representation':<16} {'MB':>8} {'bytes/movie':>12}")
+    for name, size in (('dict', dict_bytes), ('table', table_bytes)):
+        print(f"{name:<16} {size / 2 ** 20:>8.1f} {size / count:>12.0f}")
+        record(name, size / 2 ** 20, 'MB')
+
+
+# Per-request latency the dashboard recommender has to stay under
+RECOMMEND_BUDGET_MS = 10
+
+
+def percentile(values, fraction):
+    """Return the value below which the given fraction of values fall."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def bench_recommend(repeat):
+    """Measure Recommender latency for synthetic users with genre and cast weights."""
+    movies = Movies.get_cached_movies()
+    start = time.perf_counter()
+    recommender = Recommender(movies)
+    print(f"Built recommender for {len(movies)} movies in {time.perf_counter() - start:.2f}s")
+    record('build', time.perf_counter() - start, 's')
+
+    rng = random.Random(0)
+    genres = Movies.get_genres()
+    people = sorted({name for movie in rng.sample(movies, min(len(movies), 2000)) for name in movie.cast})
+    latencies = []
+    for _ in range(200 * repeat):
+        genre_weights = {genre: 1.0 + 0.2 * rng.randint(0, 5) for genre in rng.sample(genres, min(3, len(genres)))}
+        cast_weights = {name: 0.2 * rng.randint(1, 5) for name in rng.sample(people, min(len(people), rng.randint(0, 50)))}
+        reviewed = [movie.id for movie in rng.sample(movies, min(len(movies), rng.randint(0, 100)))]
+        start = time.perf_counter()
+        recommender.recommend(genre_weights, cast_weights, 15, exclude=reviewed)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    p50, p99 = percentile(latencies, 0.5), percentile(latencies, 0.99)
+    status = "within" if p99 <= RECOMMEND_BUDGET_MS else "OVER"
+    print(f"p50 {p50:.2f} ms, p99 {p99:.2f} ms ({status} the {RECOMMEND_BUDGET_MS} ms budget)")
+    record('p50', p50, 'ms')
+    record('p99', p99, 'ms')
+
+
+def bench_reviews(repeat):
+    """Compare review write throughput of full reviews.json rewrites with the journaled ReviewStore."""
+    rng = random.Random(0)
+    existing = {}
+    for i in range(20000):
+        review = synthetic_data.random_review(rng)
+        existing.setdefault(f"tt{rng.randint(0, 5000):07d}", {})[f"user{i % 2000}@example.com"] = review
+    writes = [(f"tt{rng.randint(0, 5000):07d}", f"bench{i}@example.com", synthetic_data.random_review(rng))
+              for i in range(100)]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        snapshot_file = os.path.join(temp_dir, 'reviews.json')
+        journal_file = os.path.join(temp_dir, 'reviews.journal')
+
+        def rewrite():
+            # The previous Review.dump_reviews: the whole dict on every save
+            reviews = json.loads(json.dumps(existing))
+            start = time.perf_counter()
+            for movie_id, user_email, review in writes:
+                reviews.setdefault(movie_id, {})[user_email] = review
+                with open(snapshot_file, 'w') as f:
+                    json.dump(reviews, f, indent=4)
+            return time.perf_counter() - start
+
+        def journal():
+            for path in (snapshot_file, journal_file):
+                if os.path.exists(path):
+                    os.remove(path)
+            with open(snapshot_file, 'w') as f:
+                json.dump(existing, f)
+            store = ReviewStore(snapshot_file, journal_file)
+            store.load()
+            start = time.perf_counter()
+            for movie_id, user_email, review in writes:
+                store.put(movie_id, user_email, review)
+            store.sync()
+            return time.perf_counter() - start
+
+        rewrite_time = min(rewrite() for _ in range(repeat))
+        journal_time = min(journal() for _ in range(repeat))
+
+    print(f"{len(writes)} writes over {sum(len(r) for r in existing.values())} existing reviews")
+    print(f"{'storage':<10} {'writes/s':>10}")
+    print(f"{'rewrite':<10} {len(writes) / rewrite_time:>10.0f}")
+    print(f"{'journal':<10} {len(writes) / journal_time:>10.0f}")
+    record('journal', len(writes) / journal_time, 'writes/s')
+
+
+USER_COUNTS = [1000, 10000, 50000]
+
+
+def _synthetic_user(i):
+    return {"password": f"{i:016x}", "displayName": f"User {i}",
+            "preferences": {"genres": {"Drama": 1.0, "Comedy": 1.0}, "cast": {f"Actor {i % 500}": 0.2}}}
+
+
+def bench_users(repeat):
+    """Compare registration latency of full users.json rewrites with the SQLite UserStore as users grow."""
+    writes = 20
+    print(f"{'users':>7} {'rewrite ms':>11} {'store ms':>9}")
+    for count in USER_COUNTS:
+        existing = {f"user{i}@example.com": _synthetic_user(i) for i in range(count)}
+        with tempfile.TemporaryDirectory() as temp_dir:
+            json_file = os.path.join(temp_dir, 'users.json')
+            with open(json_file, 'w') as f:
+                json.dump(existing, f)
+
+            def rewrite():
+                # The previous User.save_user: every account on every save
+                users = json.loads(json.dumps(existing))
+                start = time.perf_counter()
+                for i in range(writes):
+                    users[f"new{i}@example.com"] = _synthetic_user(i)
+                    with open(json_file, 'w') as f:
+                        json.dump(users, f, indent=4)
+                return (time.perf_counter() - start) / writes
+
+            def store():
+                db_file = os.path.join(temp_dir, 'users.db')
+                for suffix in ('', '-wal', '-shm'):
+                    if os.path.exists(db_file + suffix):
+                        os.remove(db_file + suffix)
+                user_store = UserStore(db_file, json_file)
+                start = time.perf_counter()
+                for i in range(writes):
+                    user_store.add(f"new{i}@example.com", _synthetic_user(i))
+                return (time.perf_counter() - start) / writes
+
+            rewrite_time = min(rewrite() for _ in range(repeat))
+            store_time = min(store() for _ in range(repeat))
+        print(f"{count:>7} {rewrite_time * 1000:>11.2f} {store_time * 1000:>9.2f}")
+        record(f"{count} users store", store_time * 1000, 'ms')
+
+
+DOWNLOAD_FILE_MB = 8
+# Per-connection bandwidth of the mock server, so concurrency pays off as it does over the internet
+DOWNLOAD_RATE_MB = 10
+
+
+def _write_download_files(directory):
+    """Write one DOWNLOAD_FILE_MB gzip file of TSV-like rows per IMDb file name."""
+    rng = random.Random(0)
+    for i, filename in enumerate(IMDBDownloader.IMDB_FILES):
+        with gzip.open(os.path.join(directory, filename), 'wb', compresslevel=1) as f:
+            while f.fileobj.tell() < DOWNLOAD_FILE_MB * 1024 * 1024:
+                f.write(''.join(f"tt{rng.getrandbits(32):08x}\t{rng.random():.6f}\t{i}\n"
+                                for _ in range(10000)).encode())
+
+
+def bench_download(repeat):
+    """Time IMDBDownloader sequentially and concurrently against a local mock server, then resumed and unchanged."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        served = os.path.join(temp_dir, 'served')
+        os.makedirs(served)
+        _write_download_files(served)
+        total_mb = sum(os.path.getsize(os.path.join(served, f)) for f in IMDBDownloader.IMDB_FILES) / 1e6
+
+        def run(label, workers, drop_after=None, fresh=True):
+            target = os.path.join(temp_dir, 'download')
+            best = None
+            for _ in range(repeat):
+                if fresh and os.path.exists(target):
+                    for name in os.listdir(target):
+                        os.remove(os.path.join(target, name))
+                with MockIMDBServer(served, rate=DOWNLOAD_RATE_MB * 1e6, drop_after=drop_after) as server:
+                    downloader = IMDBDownloader(target, base_url=server.url, max_workers=workers)
+                    start = time.perf_counter()
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        results = downloader.download_imdb_files()
+                    elapsed = time.perf_counter() - start
+                if best is None or elapsed < best[0]:
+                    best = (elapsed, results)
+            elapsed, results = best
+            print(f"{label}: {elapsed:.2f}s, {total_mb / elapsed:.1f} MB/s overall")
+            record(label, elapsed, 's')
+            for stats in results:
+                print(f"  {stats['filename']:<26} {stats['status']:<10} {stats['bytes'] / 1e6:>7.1f} MB "
+                      f"{stats['mb_per_s']:>7.1f} MB/s")
+
+        print(f"{len(IMDBDownloader.IMDB_FILES)} files, {total_mb:.1f} MB, {DOWNLOAD_RATE_MB} MB/s per connection")
+        run("sequential", 1)
+        run(f"{IMDBDownloader.MAX_WORKERS} workers", IMDBDownloader.MAX_WORKERS)
+        run("dropped halfway, resumed", IMDBDownloader.MAX_WORKERS,
+            drop_after=DOWNLOAD_FILE_MB * 1024 * 1024 // 2)
+        run("unchanged", IMDBDownloader.MAX_WORKERS, fresh=False)
+
+
+INGEST_TITLES = 200000
+
+
+def _parse_imdb_dumps(sources):
+    with contextlib.redirect_stdout(io.StringIO()):
+        ratings, movies, principals = Movies._read_imdb_snapshot(sources)
+        cast = Movies._resolve_cast(principals, sources)
+    return len(movies), len(cast)
+
+
+def bench_ingest(repeat):
+    """Compare downloading the IMDb dumps and then parsing them with parsing them while they stream in."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        served = os.path.join(temp_dir, 'served')
+        os.makedirs(served)
+        synthetic_data.write_imdb_dumps(served, INGEST_TITLES)
+        total_mb = sum(os.path.getsize(os.path.join(served, f)) for f in os.listdir(served)) / 1e6
+        target = os.path.join(temp_dir, 'imdb')
+
+        def fresh_downloader(server):
+            if os.path.exists(target):
+                for name in os.listdir(target):
+                    os.remove(os.path.join(target, name))
+            return IMDBDownloader(target, base_url=server.url)
+
+        def sequential():
+            with MockIMDBServer(served, rate=DOWNLOAD_RATE_MB * 1e6) as server:
+                downloader = fresh_downloader(server)
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    downloader.download_imdb_files()
+                downloaded = time.perf_counter()
+                counts = _parse_imdb_dumps({name: os.path.join(target, name) for name in os.listdir(target)
+                                            if name.endswith('.gz')})
+                return downloaded - start, time.perf_counter() - downloaded, counts
+
+        def streaming():
+            with MockIMDBServer(served, rate=DOWNLOAD_RATE_MB * 1e6) as server:
+                downloader = fresh_downloader(server)
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    streams = downloader.stream_imdb_files()
+                try:
+                    counts = _parse_imdb_dumps(streams)
+                finally:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        Movies._close_streams(streams)
+                return time.perf_counter() - start, counts
+
+        download_time, parse_time, sequential_counts = min(sequential() for _ in range(repeat))
+        stream_time, stream_counts = min(streaming() for _ in range(repeat))
+
+    print(f"{total_mb:.1f} MB of dumps, {DOWNLOAD_RATE_MB} MB/s per connection, "
+          f"{sequential_counts[0]} movies, {sequential_counts[1]} with cast")
+    print(f"{'download':<22} {download_time:>7.2f}s")
+    print(f"{'parse':<22} {parse_time:>7.2f}s")
+    print(f"{'download then parse':<22} {download_time + parse_time:>7.2f}s")
+    print(f"{'streamed':<22} {stream_time:>7.2f}s  (same result: {stream_counts == sequential_counts})")
+    record('download then parse', download_time + parse_time, 's')
+    record('streamed', stream_time, 's')
+
+
+def _imdb_sources():
+    """The IMDb dumps in Movies.IMDB_DIR, as sources for Movies._process_imdb_data."""
+    return {filename: os.path.join(Movies.IMDB_DIR, filename) for filename in IMDBDownloader.IMDB_FILES}
+
+
+@contextlib.contextmanager
+def _patched(cls, **attributes):
+    """Set class attributes, such as data files and caches, until the block ends."""
+    saved = {name: getattr(cls, name) for name in attributes}
+    for name, value in attributes.items():
+        setattr(cls, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(cls, name, value)
+
+
+def bench_process(repeat):
+    """Time Movies._process_imdb_data on the dumps in Movies.IMDB_DIR, writing the catalog to a temporary directory."""
+    sources = _imdb_sources()
+    missing = [path for path in sources.values() if not os.path.exists(path)]
+    if missing:
+        print(f"Missing {', '.join(missing)}, download the IMDb dumps or run with --synthetic")
+        return
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with _patched(Movies, CATALOG_FILE=os.path.join(temp_dir, 'movies.bin'),
+                      MOVIES_FILE=os.path.join(temp_dir, 'movies.json'),
+                      HASHES_FILE=os.path.join(temp_dir, 'movies.hashes.json'),
+                      CHANGES_FILE=os.path.join(temp_dir, 'movies.changes.json'),
+                      SEQUENCE_FILE=os.path.join(temp_dir, 'movies.sequence')):
+            with contextlib.redirect_stdout(io.StringIO()):
+                movies, seconds = timed(lambda: Movies._process_imdb_data(sources=sources), repeat)
+            catalog_mb = os.path.getsize(Movies.CATALOG_FILE) / 2 ** 20
+
+    dumps_mb = sum(os.path.getsize(path) for path in sources.values()) / 2 ** 20
+    print(f"{dumps_mb:.1f} MB of dumps to {len(movies)} movies ({catalog_mb:.1f} MB catalog) "
+          f"in {seconds:.2f}s, {len(movies) / seconds:.0f} movies/s")
+    record('movies', len(movies), 'count')
+    record('catalog size', catalog_mb, 'MB on disk')
+    record('process', seconds, 's')
+    record('throughput', len(movies) / seconds, 'movies/s')
+
+
+def bench_load(repeat):
+    """Time Movies.get_all_movies, which opens the catalog and builds the movie objects."""
+    movies, seconds = timed(Movies.get_all_movies, repeat)
+    print(f"Loaded {len(movies)} movies in {seconds * 1000:.1f} ms")
+    record('movies', len(movies), 'count')
+    record('get_all_movies', seconds * 1000, 'ms')
+
+
+DASHBOARD_USERS = 100
+
+
+def bench_dashboard(repeat):
+    """Measure Movies.get_recomendations and the whole /dashboard request for users who wrote reviews."""
+    rng = random.Random(0)
+    reviewers = sorted({email for movie_reviews in Review.load_cached_reviews().values() for email in movie_reviews})
+    users = [user for user in map(User.get_user, rng.sample(reviewers, min(len(reviewers), DASHBOARD_USERS)))
+             if user is not None]
+    if not users:
+        print("No users with reviews, run with --synthetic")
+        return
+
+    client = app.test_client()
+
+    def dashboard(user):
+        with client.session_transaction() as session:
+            session['user_email'] = user.get_email()
+        start = time.perf_counter()
+        response = client.get('/dashboard')
+        elapsed = time.perf_counter() - start
+        assert response.status_code == 200, f"/dashboard returned {response.status_code}"
+        return elapsed * 1000
+
+    # The first request builds the recommender and the similarity model
+    _, first_time = timed(lambda: dashboard(users[0]), 1)
+    recommend_latencies = []
+    dashboard_latencies = []
+    for _ in range(repeat):
+        for user in users:
+            start = time.perf_counter()
+            Movies.get_recomendations(user)
+            recommend_latencies.append((time.perf_counter() - start) * 1000)
+            dashboard_latencies.append(dashboard(user))
+
+    print(f"{len(users)} users, first request {first_time:.2f}s")
+    print(f"{'':<20} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, latencies in (('get_recomendations', recommend_latencies), ('/dashboard', dashboard_latencies)):
+        p50, p99 = percentile(latencies, 0.5), percentile(latencies, 0.99)
+        print(f"{name:<20} {p50:>8.2f} {p99:>8.2f}")
+        record(f"{name} p50", p50, 'ms')
+        record(f"{name} p99", p99, 'ms')
+
+
+SAVE_REVIEWS = 200
+
+
+def bench_save_review(repeat):
+    """Measure Review.save_review for new users, on a copy of the reviews so the real ones are untouched."""
+    movies = Movies.get_cached_movies()
+    rng = random.Random(0)
+    count = SAVE_REVIEWS * repeat
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with open(os.path.join(temp_dir, 'reviews.json'), 'w') as f:
+            json.dump(Review.load_cached_reviews(), f)
+        with _patched(Review, REVIEWS_FILE=os.path.join(temp_dir, 'reviews.json'),
+                      JOURNAL_FILE=os.path.join(temp_dir, 'reviews.journal'), _store=None, _cache=None,
+                      _user_reviews=None, _movie_reviews_cache={}, _similarity_cache=None), \
+                _patched(User, USERS_DB_FILE=os.path.join(temp_dir, 'users.db'),
+                         USERS_FILE=os.path.join(temp_dir, 'users.json'), _store=None, _users_cache=OrderedDict()):
+            for i in range(count):
+                User.get_store().add(f"bench{i}@example.com", _synthetic_user(i))
+            # Saving keeps the similarity model up to date, as it does on a server that has built it
+            Review.get_cached_similarity()
+
+            latencies = []
+            for i in range(count):
+                movie = rng.choice(movies)
+                review = synthetic_data.random_review(rng)
+                start = time.perf_counter()
+                saved, message = Review.save_review(
+                    f"bench{i}@example.com", movie, review['recommendation_score'], review['acting_score'],
+                    review['quality_score'], review['rewatch_score'], review['engagement'], review['written_review'])
+                latencies.append((time.perf_counter() - start) * 1000)
+                assert saved, message
+            Review.get_store().sync()
+
+    p50, p99 = percentile(latencies, 0.5), percentile(latencies, 0.99)
+    print(f"{count} reviews: p50 {p50:.2f} ms, p99 {p99:.2f} ms, {count / (sum(latencies) / 1000):.0f} writes/s")
+    record('p50', p50, 'ms')
+    record('p99', p99, 'ms')
+    record('throughput', count / (sum(latencies) / 1000), 'writes/s')
+
+
+BENCHMARKS = {
+    'cast': bench_cast,
+    'catalog': bench_catalog,
+    'dashboard': bench_dashboard,
+    'download': bench_download,
+    'ingest': bench_ingest,
+    'load': bench_load,
+    'memory': bench_memory,
+    'process': bench_process,
+    'recommend': bench_recommend,
+    'reviews': bench_reviews,
+    'save_review': bench_save_review,
+    'search': bench_search,
+    'suggest': bench_suggest,
+    'topk': bench_topk,
+    'users': bench_users,
+}
+
+
+def use_synthetic_data(directory, titles, users, reviews_per_user):
+    """Generate a dataset in directory, point the app's data files at it and build its catalog."""
+    start = time.perf_counter()
+    dataset = synthetic_data.write_dataset(directory, titles, users, reviews_per_user)
+    Movies.IMDB_DIR = os.path.join(directory, 'imdb')
+    Movies.CATALOG_FILE = os.path.join(directory, 'movies.bin')
+    Movies.MOVIES_FILE = os.path.join(directory, 'movies.json')
+    Movies.HASHES_FILE = os.path.join(directory, 'movies.hashes.json')
+    Movies.CHANGES_FILE = os.path.join(directory, 'movies.changes.json')
+    Movies.SEQUENCE_FILE = os.path.join(directory, 'movies.sequence')
+    Review.REVIEWS_FILE = User.REVIEWS_FILE = os.path.join(directory, 'reviews.json')
+    Review.JOURNAL_FILE = os.path.join(directory, 'reviews.journal')
+    User.USERS_DB_FILE = os.path.join(directory, 'users.db')
+    User.USERS_FILE = os.path.join(directory, 'users.json')
+    with contextlib.redirect_stdout(io.StringIO()):
+        Movies._process_imdb_data(sources=_imdb_sources())
+    print(f"Generated {dataset['titles']} titles ({dataset['movies']} movies), {dataset['users']} users and "
+          f"{dataset['reviews']} reviews in {time.perf_counter() - start:.1f}s")
+    return dict(dataset, source='synthetic')
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(path, repeat, dataset):
+    """Write the run's measurements and what they were measured on as JSON."""
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'repeat': repeat,
+        'dataset': dataset,
+        'results': RESULTS,
+    }
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(RESULTS)} measurements to {path}")
+
+
+def compare_results(path, tolerance):
+    """Print how each measurement changed from the run saved in path; return how many got worse than tolerance."""
+    with open(path) as f:
+        baseline = {(result['benchmark'], result['metric']): result for result in json.load(f)['results']}
+
+    regressions = 0
+    print(f"{'benchmark':<12} {'metric':<50} {'before':>10} {'after':>10} {'change':>8}")
+    for result in RESULTS:
+        before = baseline.get((result['benchmark'], result['metric']))
+        if before is None or result['unit'] in INFO_UNITS or before['unit'] != result['unit']:
+            continue
+        old, new = before['value'], result['value']
+        if not old or not new:
+            continue
+        # Positive when the measurement got worse, as a fraction of the better value
+        worse = old / new - 1 if result['unit'] in HIGHER_IS_BETTER else new / old - 1
+        status = ''
+        if worse > tolerance:
+            regressions += 1
+            status = ' REGRESSION'
+        print(f"{result['benchmark']:<12} {result['metric'][:50]:<50} {old:>10.3f} {new:>10.3f} "
+              f"{new / old - 1:>+8.0%}{status}")
+    print(f"{regressions} measurements more than {tolerance:.0%} worse than {path}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('benchmarks', nargs='*', help=f"benchmarks to run: {', '.join(sorted(BENCHMARKS))} (default: all)")
+    parser.add_argument('--repeat', type=int, default=5, help="runs per measurement, best is reported")
+    parser.add_argument('--synthetic', type=int, metavar='TITLES',
+                        help="run on a generated dataset with this many IMDb titles (10k to 1M)")
+    parser.add_argument('--users', type=int, default=10000, help="users in the generated dataset")
+    parser.add_argument('--reviews-per-user', type=int, default=10, help="average reviews per generated user")
+    parser.add_argument('--json', metavar='FILE', help="write the measurements to FILE as JSON")
+    parser.add_argument('--compare', metavar='FILE', help="compare the measurements with a file written by --json")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="fraction by which a measurement may get worse before --compare fails")
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    # Benchmarks swap data files under the app; a watcher would reload the catalog from them
+    Movies.disable_catalog_watcher()
+    global _running
+    with tempfile.TemporaryDirectory() as temp_dir:
+        dataset = {'source': 'data'}
+        if args.synthetic:
+            print("== synthetic data ==")
+            dataset = use_synthetic_data(temp_dir, args.synthetic, args.users, args.reviews_per_user)
+
+        for name in args.benchmarks or sorted(BENCHMARKS):
+            print(f"== {name} ==")
+            _running = name
+            BENCHMARKS[name](args.repeat)
+
+    if args.json:
+        write_results(args.json, args.repeat, dataset)
+    if args.compare:
+        print("== compare ==")
+        if compare_results(args.compare, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import heapq
+import math
+
+
+class ItemSimilarity:
+    """Item-item collaborative filtering over the review matrix.
+
+    The user x movie rating matrix is kept sparse in both orientations
+    (user -> {movie: rating} and movie -> {user: rating}). For every movie
+    the NEIGHBOURS most similar movies by cosine similarity of their
+    rating columns are precomputed, so a lookup is a single dict access.
+    When one rating changes only the movies that share a reviewer with it
+    have their neighbour lists recomputed.
+    """
+
+    NEIGHBOURS = 10
+
+    def __init__(self, reviews):
+        """Build the model from a {movie_id: {user_email: review}} dict, as stored in reviews.json."""
+        self._user_items = {}
+        self._item_users = {}
+        self._norms = {}
+        self._neighbours = {}
+        for movie_id, movie_reviews in reviews.items():
+            for user_email, review in movie_reviews.items():
+                self._set(user_email, movie_id, review['rating'])
+        for movie_id in self._item_users:
+            self._neighbours[movie_id] = self._compute_neighbours(movie_id)
+
+    def _set(self, user_email, movie_id, rating):
+        """Store or (with rating None) remove one cell of the matrix."""
+        if rating is None:
+            self._user_items.get(user_email, {}).pop(movie_id, None)
+            self._item_users.get(movie_id, {}).pop(user_email, None)
+            if not self._user_items.get(user_email, True):
+                del self._user_items[user_email]
+        else:
+            self._user_items.setdefault(user_email, {})[movie_id] = rating
+            self._item_users.setdefault(movie_id, {})[user_email] = rating
+
+        users = self._item_users.get(movie_id)
+        if users:
+            self._norms[movie_id] = math.sqrt(sum(r * r for r in users.values()))
+        else:
+            self._item_users.pop(movie_id, None)
+            self._norms.pop(movie_id, None)
+
+    def _compute_neighbours(self, movie_id):
+        """Return the most similar movies to movie_id as [(movie_id, similarity)], best first."""
+        dots = {}
+        for user_email, rating in self._item_users.get(movie_id, {}).items():
+            for other_id, other_rating in self._user_items[user_email].items():
+                if other_id != movie_id:
+                    dots[other_id] = dots.get(other_id, 0.0) + rating * other_rating
+        norm = self._norms.get(movie_id)
+        if not dots or not norm:
+            return []
+        similarities = ((other_id, dot / (norm * self._norms[other_id])) for other_id, dot in dots.items())
+        return heapq.nlargest(ItemSimilarity.NEIGHBOURS, similarities, key=lambda pair: (pair[1], pair[0]))
+
+    def update(self, user_email, movie_id, rating):
+        """Apply a new rating (or a deleted one, with rating None) and refresh affected neighbour lists."""
+        # Movies sharing a reviewer with movie_id before or after the change
+        affected = {movie_id}
+        for other_email in self._item_users.get(movie_id, {}):
+            affected.update(self._user_items[other_email])
+
+        self._set(user_email, movie_id, rating)
+
+        for other_email in self._item_users.get(movie_id, {}):
+            affected.update(self._user_items[other_email])
+        affected.update(self._user_items.get(user_email, {}))
+
+        for affected_id in affected:
+            neighbours = self._compute_neighbours(affected_id)
+            if neighbours:
+                self._neighbours[affected_id] = neighbours
+            else:
+                self._neighbours.pop(affected_id, None)
+
+    def neighbours(self, movie_id):
+        """Return the precomputed [(movie_id, similarity)] neighbours of a movie."""
+        return self._neighbours.get(movie_id, [])
+
+    def recommend(self, ratings, limit, min_rating=0):
+        """Return up to limit movie ids liked by people who liked the same movies.
+
+        ratings is one user's {movie_id: rating}. Neighbours of the movies
+        they rated at least min_rating are scored by similarity times
+        rating; movies already in ratings are left out.
+        """
+        scores = {}
+        for movie_id, rating in ratings.items():
+            if rating < min_rating:
+                continue
+            for other_id, similarity in self.neighbours(movie_id):
+                if other_id not in ratings:
+                    scores[other_id] = scores.get(other_id, 0.0) + similarity * rating
+        best = heapq.nlargest(limit, scores.items(), key=lambda pair: (pair[1], pair[0]))
+        return [movie_id for movie_id, _ in best]
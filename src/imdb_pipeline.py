@@ -0,0 +1,139 @@
+"""Streaming parsers for the gzipped IMDb TSV dumps.
+
+Each stage reads one file with csv.reader and keeps only the rows that
+later stages need, so Movies._process_imdb_data never holds a whole dump
+in memory. The functions are module level so they can run in a worker
+process.
+"""
+
+import csv
+import gzip
+import hashlib
+
+# Only keep ratings with at least this many votes
+MIN_VOTES = 1000
+
+# Principal categories stored as the movie's cast
+CAST_CATEGORIES = ('actor', 'actress', 'director')
+
+# IMDb's marker for a missing value
+NULL = '\\N'
+
+
+def _columns(reader, *names):
+    """Read the header row and return the position of each named column."""
+    header = next(reader, [])
+    return tuple(header.index(name) for name in names)
+
+
+def read_ratings(path):
+    """Return ({tconst: (averageRating, numVotes)}, total rows) for well-voted titles."""
+    ratings = {}
+    total = 0
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        reader = csv.reader(f, delimiter='\t')
+        tconst, average_rating, num_votes = _columns(reader, 'tconst', 'averageRating', 'numVotes')
+        for row in reader:
+            if not row:
+                continue
+            total += 1
+            try:
+                votes = int(row[num_votes])
+                if votes >= MIN_VOTES:
+                    ratings[row[tconst]] = (float(row[average_rating]), votes)
+            except (ValueError, IndexError):
+                continue
+    return ratings, total
+
+
+def read_basics(path, movie_ids):
+    """Return ([(tconst, title, year, runtime, genres)], total rows) for the given movies, in file order.
+
+    Only non-adult movies with a year are kept. Filtering on movie_ids,
+    the titles that passed the ratings filter, happens here so only
+    those movies are sent back from a worker process.
+    """
+    movies = []
+    total = 0
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        reader = csv.reader(f, delimiter='\t')
+        columns = _columns(reader, 'tconst', 'titleType', 'primaryTitle', 'isAdult',
+                           'startYear', 'runtimeMinutes', 'genres')
+        tconst, title_type, primary_title, is_adult, start_year, runtime_minutes, genres = columns
+        for row in reader:
+            if not row:
+                continue
+            total += 1
+            try:
+                if row[tconst] not in movie_ids or row[title_type] != 'movie' or row[is_adult] == '1' \
+                        or row[start_year] == NULL:
+                    continue
+                year = int(row[start_year])
+                runtime = int(row[runtime_minutes]) if row[runtime_minutes] != NULL else None
+                movie_genres = row[genres].split(',') if row[genres] != NULL else []
+                movies.append((row[tconst], row[primary_title], year, runtime, movie_genres))
+            except (ValueError, IndexError):
+                continue
+    return movies, total
+
+
+def read_principals(path, movie_ids):
+    """Return ([(tconst, category, nconst)], total rows) for cast rows of the given movies, in file order."""
+    principals = []
+    total = 0
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        reader = csv.reader(f, delimiter='\t')
+        tconst, nconst, category = _columns(reader, 'tconst', 'nconst', 'category')
+        for row in reader:
+            if not row:
+                continue
+            total += 1
+            try:
+                if row[tconst] in movie_ids and row[category] in CAST_CATEGORIES:
+                    principals.append((row[tconst], row[category], row[nconst]))
+            except IndexError:
+                continue
+            if total % 1000000 == 0:
+                print(f"  Processed {total} principals, {len(principals)} cast rows kept")
+    return principals, total
+
+
+def read_names(path, nconsts):
+    """Return ({nconst: primaryName}, total rows) for the given people only."""
+    names = {}
+    total = 0
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        reader = csv.reader(f, delimiter='\t')
+        nconst, primary_name = _columns(reader, 'nconst', 'primaryName')
+        for row in reader:
+            if not row:
+                continue
+            total += 1
+            try:
+                if row[nconst] in nconsts:
+                    names[row[nconst]] = row[primary_name]
+            except IndexError:
+                continue
+    return names, total
+
+
+def build_cast(principals, names):
+    """Group principal rows into {tconst: {category: [names]}}, keeping file order and dropping duplicates."""
+    cast_data = {}
+    for movie_id, category, person_id in principals:
+        person_name = names.get(person_id)
+        if person_name is None:
+            continue
+        if movie_id not in cast_data:
+            cast_data[movie_id] = {category: [] for category in CAST_CATEGORIES}
+        people = cast_data[movie_id][category]
+        if person_name not in people:
+            people.append(person_name)
+    return cast_data
+
+
+def content_hashes(movie, rating, principals):
+    """Return (core, cast) hashes of a movie's basics and rating, and of its principal rows."""
+    core = hashlib.blake2b(repr((movie, rating)).encode('utf-8'), digest_size=8).hexdigest()
+    cast = hashlib.blake2b(repr(principals).encode('utf-8'), digest_size=8).hexdigest()
+    return core, cast
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Load test for serve.py.
+Starts the server with 1, 2, 4 and 8 workers in turn and reports requests
+per second and p99 latency for /search and /dashboard under concurrent
+clients. Run after process_imdb.py so the catalog exists. A test user is
+registered on the first run and reused afterwards.
+
+Usage: python load_test.py [--workers 1 2 4 8] [--clients N] [--duration SECONDS]
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import http.client
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlencode
+
+TEST_EMAIL = 'loadtest@example.com'
+TEST_PASSWORD = 'LoadTest123'
+GENRES = ['Drama', 'Comedy', 'Action', 'Thriller', 'Romance', 'Horror', 'Documentary', 'Crime']
+TITLES = ['the', 'love', 'night', 'star', 'man', 'day']
+STARTUP_TIMEOUT = 300
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def request(port, method, path, body=None, cookie=None):
+    """Send one request and return (status, headers, seconds taken)."""
+    headers = {}
+    if body is not None:
+        body = urlencode(body, doseq=True)
+        headers['Content-Type'] = 'application/x-www-form-urlencoded'
+    if cookie:
+        headers['Cookie'] = cookie
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    start = time.perf_counter()
+    try:
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        return response.status, response.getheaders(), time.perf_counter() - start
+    finally:
+        connection.close()
+
+
+def wait_until_ready(port, server):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("serve.py exited during startup")
+        try:
+            request(port, 'GET', '/login')
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("serve.py did not start in time")
+
+
+def log_in(port):
+    """Register the test user if needed, log in and return the session cookie."""
+    request(port, 'POST', '/register', {
+        'email': TEST_EMAIL, 'password': TEST_PASSWORD, 'confirm_password': TEST_PASSWORD,
+        'displayName': 'Load Test', 'preferred_genres': GENRES[:3]})
+    _, headers, _ = request(port, 'POST', '/login', {'email': TEST_EMAIL, 'password': TEST_PASSWORD})
+    for name, value in headers:
+        if name.lower() == 'set-cookie' and value.startswith('session='):
+            return value.split(';', 1)[0]
+    raise RuntimeError("could not log in as the test user")
+
+
+def search_path(rng):
+    query = {'genre': rng.choice(GENRES)}
+    if rng.random() < 0.5:
+        query['title'] = rng.choice(TITLES)
+    if rng.random() < 0.3:
+        query['year'] = rng.randint(1970, 2020)
+    return '/search?' + urlencode(query)
+
+
+def run_client(port, cookie, duration, seed):
+    """Send requests for duration seconds and return {route: [latency in seconds]}."""
+    rng = random.Random(seed)
+    latencies = {'/search': [], '/dashboard': []}
+    errors = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        route = '/search' if rng.random() < 0.7 else '/dashboard'
+        path = search_path(rng) if route == '/search' else route
+        status, _, elapsed = request(port, 'GET', path, cookie=cookie)
+        if status == 200:
+            latencies[route].append(elapsed)
+        else:
+            errors += 1
+    return latencies, errors
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def load_test(workers, clients, duration):
+    """Run one load test against a server with the given number of workers."""
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'serve.py'),
+         '--port', str(port), '--workers', str(workers)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_ready(port, server)
+        cookie = log_in(port)
+        with ProcessPoolExecutor(max_workers=clients) as pool:
+            results = list(pool.map(run_client, [port] * clients, [cookie] * clients,
+                                    [duration] * clients, range(clients)))
+    finally:
+        server.terminate()
+        server.wait()
+
+    errors = sum(e for _, e in results)
+    for route in ('/search', '/dashboard'):
+        latencies = [latency for client, _ in results for latency in client[route]]
+        if not latencies:
+            print(f"{workers:>7} {route:<11} {'no successful requests':>24}")
+            continue
+        print(f"{workers:>7} {route:<11} {len(latencies) / duration:>9.1f} "
+              f"{percentile(latencies, 0.5) * 1000:>9.1f} {percentile(latencies, 0.99) * 1000:>9.1f}")
+    if errors:
+        print(f"        {errors} failed requests")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8], help="worker counts to test")
+    parser.add_argument('--clients', type=int, default=16, help="concurrent client processes")
+    parser.add_argument('--duration', type=float, default=10, help="seconds of load per worker count")
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.clients} clients, {args.duration:g}s per run")
+    print(f"{'workers':>7} {'route':<11} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for workers in args.workers:
+        load_test(workers, args.clients, args.duration)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,48 @@
-from flask import Flask, flash, render_template, request, redirect, url_for, session, jsonify
+from flask import Flask, flash, render_template, request, redirect, url_for, session, jsonify, g
 from user import User
 from review import Review
 from movies import Movies
 from auth import login_required
-from functools import lru_cache
+from metrics import Metrics, SamplingProfiler
+import time
 
 
 app = Flask(__name__)
 app.secret_key = 'your_secret_key_here'  # Change this to a random secret key
 
+
+@app.before_request
+def refresh_shared_data():
+    g.request_started = time.perf_counter()
+    # Whatever runs the app, a new catalog is loaded in the background
+    # rather than by a request; a no-op once this process has a watcher
+    Movies.start_catalog_watcher()
+    # When serve.py runs several worker processes, pick up the users and
+    # reviews the other workers saved
+    User.refresh_users()
+    Review.refresh_reviews()
+
+
+@app.after_request
+def record_request(response):
+    # Latency per route pattern, so /api/movies/<movie_id>/reviews is one histogram
+    started = g.get('request_started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        Metrics.observe(f"route {request.method} {route}", time.perf_counter() - started)
+        Metrics.count(f"http.{response.status_code}")
+    return response
+
+
+def render(template, **context):
+    """render_template, timed per template."""
+    with Metrics.timer(f"render {template}"):
+        return render_template(template, **context)
+
+
 @app.route('/')
 def home():
-    return render_template("index.html")
+    return render("index.html")
 
 @app.route('/register', methods=['GET', 'POST'])
 def register():
@@ -33,7 +64,7 @@ def register():
         else:
             flash(message, 'error')
 
-    return render_template("register.html", genres=Movies.get_cached_genres(), email=email)
+    return render("register.html", genres=Movies.get_cached_genres(), email=email)
 
 # Handles user login by validating credentials and starting a session if authentication succeeds
 @app.route('/login', methods=['GET', 'POST'])
@@ -51,7 +82,7 @@ def login():
         else:
             flash(message, 'error')
     
-    return render_template("login.html")
+    return render("login.html")
 
 @app.route('/delete_review/<movie_id>', methods=['POST'])
 @login_required
@@ -59,20 +90,9 @@ def delete_review(movie_id):
     # Retrieve the logged‑in user's email from the session
     user_email = session['user_email']
 
-    # Load the user object so their personal review list can be updated
-    user = User.get_user(user_email)
-
-    # Remove the movie from the user's saved review list (dashboard)
-    Review.delete_movie_review(movie_id)
-
-    # Load all reviews stored in reviews.json
-    reviews = Review.load_cached_reviews()
-
-    # Delete only this user's review for the specified movie
-    del reviews[movie_id][user_email]
-
-    # Save the updated reviews dictionary back to reviews.json
-    Review.dump_reviews(reviews)
+    # Delete only this user's review for the specified movie, from both
+    # the review journal and the user's review list (dashboard)
+    Review.remove_review(user_email, movie_id)
 
     # Return a 200 OK response to indicate successful deletion
     return '', 200
@@ -86,12 +106,14 @@ def dashboard():
     genres = Movies.get_cached_genres()
     user_recommendations=Movies.get_recomendations(user)
     user_reviews = Movies.get_user_reviews(user)    
-    return render_template(
+    also_liked = Movies.get_also_liked(user)
+    return render(
         "dashboard.html",
         user=user,
         genres=genres,
         user_reviews=user_reviews,
-        recommendations=user_recommendations
+        recommendations=user_recommendations,
+        also_liked=also_liked
     )
     
 
@@ -138,6 +160,28 @@ def reviews():
         return redirect(request.referrer)
  
 
+@app.route('/api/movies/<movie_id>/reviews')
+@login_required
+def movie_reviews(movie_id):
+    # Reviews are fetched a page at a time when the reviews modal opens,
+    # instead of being inlined into every movie card
+    cursor = request.args.get('cursor')
+    limit = request.args.get('limit', Review.REVIEWS_PAGE_SIZE, type=int)
+    limit = min(max(limit, 1), Review.MAX_REVIEWS_PAGE_SIZE)
+    reviews, next_cursor = Review.get_reviews_page(movie_id, cursor, limit)
+    return jsonify(reviews=reviews, next_cursor=next_cursor)
+
+
+@app.route('/api/suggest')
+@login_required
+def suggest():
+    # Title autocomplete for the search form, called on every keystroke
+    query = request.args.get('q', '')
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 20)
+    movies = Movies.get_cached_suggester().suggest(query, limit)
+    return jsonify(suggestions=[{"id": movie.id, "title": movie.title, "year": movie.year} for movie in movies])
+
+
 @app.route('/search')
 @login_required
 def search():
@@ -148,79 +192,27 @@ def search():
     cast = request.args.get('cast', '').lower()
     rating = request.args.get('rating', '')
     
-    print(f"Search filters - Title: {title}, Genre: {genre}, Year: {year}, Cast: {cast}, Rating: {rating}")
-    
-    # Use cached movies instead of loading from disk
-    movies = Movies.get_cached_movies()
     genres = Movies.get_cached_genres()
-    results = []
     
-    # Limit results to 500 for performance
+    # Limit results to 50 for performance
     MAX_RESULTS = 50
 
     user_email = session['user_email']
     user = User.get_user(user_email)
-    # Filter movies based on all parameters
-    for movie in movies:
-        try:
-            # Title filter
-            if title and title not in movie.title.lower():
-                continue
-            
-            # Genre filter
-            if genre and genre not in movie.genres:
-                continue
-            
-            # Year filter
-            if year:
-                try:
-                    year_int = int(year)
-                    movie_year = movie.year
-                    if movie_year != year_int:
-                        continue
-                except (ValueError, TypeError):
-                    pass
-            
-            # Rating filter (minimum rating)
-            if rating:
-                try:
-                    rating_float = float(rating)
-                    movie_rating = movie.rating
-                    if movie_rating is None or movie_rating < rating_float:
-                        continue
-                except (ValueError, TypeError):
-                    pass
-            
-            # Cast filter (if available)
-            if cast and 'cast' in movie:
-                if cast not in movie.cast.lower():
-                    continue
-            movie.temp_status = movie.get_user_review(user)
-            # Movie passed all filters
-            results.append(movie)
-        except Exception as e:
-            print(f"Error filtering movie {movie.id}: {e}")
-            continue
-    
-    # Sort results by weighted rating (rating adjusted by vote count)
-    # This prevents high-rated movies with few votes from ranking above well-voted movies
-    def weighted_rating(m):
-        rating = m.rating or 0 
-        votes = m.votes or 0
-        # Weighted formula: higher votes increase confidence in the rating
-        # Uses (votes / votes + 5000) * rating to balance rating and vote count
-        return (votes / (votes + 5000)) * rating
-    
-    results.sort(key=weighted_rating, reverse=True)
-    
-    # Limit to top MAX_RESULTS after sorting
-    results = results[:MAX_RESULTS]
+
+    # Filter movies on all parameters, sorted by weighted rating (rating
+    # adjusted by vote count) so high-rated movies with few votes do not
+    # rank above well-voted movies, keeping only the top MAX_RESULTS.
+    # Repeated searches are answered from the search cache
+    results = Movies.search_movies(title=title, genre=genre, year=year, cast=cast,
+                                   rating=rating, limit=MAX_RESULTS)
+    # Mark the movies this user already reviewed on per-request views, so
+    # the cached movies shared with other requests are left untouched
+    results = Movies.annotate_user_reviews(results, user)
     
     result_count = len(results)
-    if result_count == MAX_RESULTS:
-        print(f"Showing top {MAX_RESULTS} results by rating. Refine your search to see different results.")
     
-    return render_template("search.html", 
+    return render("search.html", 
                          title=title, 
                          year=year, 
                          cast=cast, 
@@ -229,5 +221,35 @@ def search():
                          genres=genres,
                          result_count=result_count)
 
+@app.route('/metrics')
+def metrics():
+    # Counters, cache statistics and latency histograms of this process
+    return jsonify(Metrics.snapshot())
+
+
+@app.route('/metrics/profile', methods=['GET', 'POST'])
+def metrics_profile():
+    # The sampling profiler is off unless the server runs with
+    # MOVIE_MATCHER_PROFILER=1 and it is started here: POST ?enable=1
+    # starts it, POST ?enable=0 stops it and GET returns the collapsed
+    # stacks sampled so far, for flame graph tools
+    if not Metrics.profiler_enabled:
+        return 'Not Found', 404
+    if request.method == 'POST':
+        if request.args.get('enable') == '1':
+            interval = request.args.get('interval', SamplingProfiler.INTERVAL, type=float)
+            try:
+                Metrics.start_profiler(interval)
+            except ValueError as e:
+                return f"{e}\n", 400
+            return 'Profiler started\n'
+        profile = Metrics.stop_profiler()
+    else:
+        profile = Metrics.profile(request.args.get('limit', type=int))
+    if profile is None:
+        return 'Profiler is not running\n', 404
+    return profile, 200, {'Content-Type': 'text/plain; charset=utf-8'}
+
+
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
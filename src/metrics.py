@@ -0,0 +1,238 @@
+"""Counters, latency histograms and a sampling profiler for the /metrics endpoint.
+
+Everything is kept in memory per process: each serve.py worker reports
+its own numbers, tagged with its pid. Recording is a dict update under a
+lock, and with metrics disabled (MOVIE_MATCHER_METRICS=0) every call
+returns straight away and timer hands back a shared no-op context, so
+instrumented hot paths cost next to nothing. The profiler can only be
+started when MOVIE_MATCHER_PROFILER=1.
+"""
+
+import bisect
+import os
+import sys
+import threading
+import time
+
+
+class Histogram:
+    """Latency histogram with fixed buckets, in seconds."""
+
+    # Upper bounds of the buckets; the last bucket takes everything slower
+    BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+               0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(Histogram.BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(Histogram.BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, fraction):
+        """Return the upper bound of the bucket holding the given quantile."""
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(Histogram.BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            'buckets': {str(bound): count for bound, count in zip(Histogram.BUCKETS + ('inf',), self.counts)},
+        }
+
+
+class _Timer:
+    """Context manager that records its duration in a histogram."""
+
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        Metrics.observe(self.name, time.perf_counter() - self.start)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class SamplingProfiler:
+    """Statistical profiler that samples every thread's stack from a background thread.
+
+    Samples are counted as collapsed stacks ("module:function;..." from
+    the outermost frame), the input format of flame graph tools. Nothing
+    is traced between samples, so the server runs at close to full speed.
+    """
+
+    INTERVAL = 0.005
+    # Shorter intervals would keep the sampling thread holding the GIL
+    MIN_INTERVAL = 0.001
+    MAX_INTERVAL = 1.0
+    MAX_DEPTH = 40
+
+    def __init__(self, interval=INTERVAL):
+        if not SamplingProfiler.MIN_INTERVAL <= interval <= SamplingProfiler.MAX_INTERVAL:
+            raise ValueError(f"interval must be between {SamplingProfiler.MIN_INTERVAL} "
+                             f"and {SamplingProfiler.MAX_INTERVAL} seconds")
+        self.interval = interval
+        self.samples = {}
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < SamplingProfiler.MAX_DEPTH:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                key = ';'.join(reversed(stack))
+                self.samples[key] = self.samples.get(key, 0) + 1
+            self.sample_count += 1
+
+    def report(self, limit=None):
+        """Return the collapsed stacks, most sampled first, one "stack count" per line."""
+        stacks = sorted(list(self.samples.items()), key=lambda item: item[1], reverse=True)
+        return '\n'.join(f"{stack} {count}" for stack, count in stacks[:limit]) + '\n'
+
+
+class Metrics:
+    """Process-wide metrics registry."""
+
+    enabled = os.environ.get('MOVIE_MATCHER_METRICS', '1') != '0'
+    profiler_enabled = os.environ.get('MOVIE_MATCHER_PROFILER', '0') == '1'
+    _lock = threading.Lock()
+    _counters = {}
+    _histograms = {}
+    # {name: function returning the current value}, read when metrics are served
+    _gauges = {}
+    _profiler = None
+    _started_at = time.time()
+
+    @staticmethod
+    def count(name, amount=1):
+        """Add amount to a counter."""
+        if not Metrics.enabled:
+            return
+        with Metrics._lock:
+            Metrics._counters[name] = Metrics._counters.get(name, 0) + amount
+
+    @staticmethod
+    def observe(name, seconds):
+        """Record a duration in the named histogram."""
+        if not Metrics.enabled:
+            return
+        with Metrics._lock:
+            histogram = Metrics._histograms.get(name)
+            if histogram is None:
+                histogram = Metrics._histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    @staticmethod
+    def timer(name):
+        """Return a context manager that records the time spent inside it."""
+        return _Timer(name) if Metrics.enabled else _NULL_TIMER
+
+    @staticmethod
+    def gauge(name, read):
+        """Register a function whose value is reported as name."""
+        Metrics._gauges[name] = read
+
+    @staticmethod
+    def snapshot():
+        """Return every metric as a JSON-friendly dict."""
+        with Metrics._lock:
+            counters = dict(Metrics._counters)
+            histograms = {name: histogram.to_dict() for name, histogram in Metrics._histograms.items()}
+        profiler = Metrics._profiler
+        return {
+            'pid': os.getpid(),
+            'enabled': Metrics.enabled,
+            'uptime_seconds': time.time() - Metrics._started_at,
+            'counters': counters,
+            'gauges': {name: read() for name, read in Metrics._gauges.items()},
+            'histograms': histograms,
+            'profiler': None if profiler is None else {'samples': profiler.sample_count,
+                                                       'interval': profiler.interval},
+        }
+
+    @staticmethod
+    def reset():
+        """Clear the counters and histograms."""
+        with Metrics._lock:
+            Metrics._counters = {}
+            Metrics._histograms = {}
+
+    @staticmethod
+    def start_profiler(interval=SamplingProfiler.INTERVAL):
+        """Start sampling stacks, discarding any earlier profile.
+
+        Raises ValueError, leaving any running profiler alone, if interval
+        is outside [MIN_INTERVAL, MAX_INTERVAL].
+        """
+        profiler = SamplingProfiler(interval)
+        with Metrics._lock:
+            if Metrics._profiler is not None:
+                Metrics._profiler.stop()
+            Metrics._profiler = profiler.start()
+
+    @staticmethod
+    def stop_profiler():
+        """Stop sampling and return the profile, or None if the profiler was not running."""
+        with Metrics._lock:
+            profiler, Metrics._profiler = Metrics._profiler, None
+        if profiler is None:
+            return None
+        profiler.stop()
+        return profiler.report()
+
+    @staticmethod
+    def profile(limit=None):
+        """Return the profile collected so far, or None if the profiler is not running."""
+        profiler = Metrics._profiler
+        return None if profiler is None else profiler.report(limit)
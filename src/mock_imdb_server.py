@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the IMDb dataset server, for testing and benchmarking
+IMDBDownloader without the network.
+
+Serves the files of a directory with ETag and Last-Modified validators
+and supports conditional requests (If-None-Match, If-Modified-Since),
+single byte ranges and If-Range, like the real server. It can also limit
+each connection's bandwidth and drop a file's first connection partway
+through, to exercise resuming.
+
+Usage: python mock_imdb_server.py DIRECTORY [--port PORT] [--rate MB_PER_S] [--drop-after BYTES]
+"""
+import argparse
+import email.utils
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import threading
+import time
+
+
+class MockIMDBServer:
+    """A threaded HTTP server for the files in a directory, run in the background."""
+
+    SEND_SIZE = 64 * 1024
+
+    def __init__(self, directory, port=0, rate=None, drop_after=None):
+        """Serve directory on port (0 picks a free one).
+
+        rate limits each connection to that many bytes per second, and
+        drop_after closes the first connection for each file once it has
+        sent that many bytes.
+        """
+        self.directory = directory
+        self.rate = rate
+        self.drop_after = drop_after
+        self.requests = []
+        self._dropped = set()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        """Base URL of the served directory, ending in a slash."""
+        return f"http://127.0.0.1:{self._server.server_address[1]}/"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _should_drop(self, filename):
+        """Return True the first time a file is requested, if drops are enabled."""
+        if self.drop_after is None:
+            return False
+        with self._lock:
+            if filename in self._dropped:
+                return False
+            self._dropped.add(filename)
+            return True
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                filename = os.path.basename(self.path.split('?', 1)[0])
+                path = os.path.join(server.directory, filename)
+                with server._lock:
+                    server.requests.append((filename, dict(self.headers)))
+                if not filename or not os.path.isfile(path):
+                    self.send_error(404)
+                    return
+
+                stat = os.stat(path)
+                size = stat.st_size
+                etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+                last_modified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+
+                if self._not_modified(etag, stat.st_mtime):
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+
+                start, end = 0, size
+                byte_range = self.headers.get('Range')
+                if_range = self.headers.get('If-Range')
+                if byte_range and byte_range.startswith('bytes=') and if_range in (None, etag, last_modified):
+                    first, _, last = byte_range[len('bytes='):].partition('-')
+                    start = int(first)
+                    end = int(last) + 1 if last else size
+                    if start >= size:
+                        self.send_response(416)
+                        self.send_header('Content-Range', f"bytes */{size}")
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header('Content-Range', f"bytes {start}-{end - 1}/{size}")
+                else:
+                    self.send_response(200)
+                self.send_header('Content-Type', 'application/octet-stream')
+                self.send_header('Content-Length', str(end - start))
+                self.send_header('ETag', etag)
+                self.send_header('Last-Modified', last_modified)
+                self.send_header('Accept-Ranges', 'bytes')
+                self.end_headers()
+                self._send_file(path, start, end, server._should_drop(filename))
+
+            def _not_modified(self, etag, mtime):
+                if_none_match = self.headers.get('If-None-Match')
+                if if_none_match is not None:
+                    return etag in [tag.strip() for tag in if_none_match.split(',')]
+                if_modified_since = self.headers.get('If-Modified-Since')
+                if if_modified_since:
+                    since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+                    return int(mtime) <= since
+                return False
+
+            def _send_file(self, path, start, end, drop):
+                sent = 0
+                began = time.perf_counter()
+                with open(path, 'rb') as f:
+                    f.seek(start)
+                    while start + sent < end:
+                        chunk = f.read(min(server.SEND_SIZE, end - start - sent))
+                        if drop and sent + len(chunk) > server.drop_after:
+                            self.wfile.write(chunk[:server.drop_after - sent])
+                            self.close_connection = True
+                            return
+                        self.wfile.write(chunk)
+                        sent += len(chunk)
+                        if server.rate:
+                            # Sleep until the connection is back within its rate
+                            delay = sent / server.rate - (time.perf_counter() - began)
+                            if delay > 0:
+                                time.sleep(delay)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('directory', help="directory of files to serve")
+    parser.add_argument('--port', type=int, default=8001, help="port to listen on")
+    parser.add_argument('--rate', type=float, help="bandwidth per connection in MB/s")
+    parser.add_argument('--drop-after', type=int, help="drop each file's first connection after this many bytes")
+    args = parser.parse_args()
+
+    server = MockIMDBServer(args.directory, args.port,
+                            rate=args.rate * 1e6 if args.rate else None, drop_after=args.drop_after)
+    print(f"Serving {args.directory} on {server.url}", flush=True)
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+from array import array
+import math
+import mmap
+import os
+import struct
+import sys
+
+
+class MovieCatalog:
+    """Read-only columnar movie catalog stored in a single memory-mapped file.
+
+    All text (ids, titles, genres and people) lives in one string table of
+    NUL-separated UTF-8 bytes addressed by an offset array. Numeric fields are typed
+    columns with one value per movie, and genres and cast members are
+    offset arrays into lists of string ids. Opening a catalog maps the
+    file and slices it into typed memoryviews without parsing anything.
+    """
+
+    MAGIC = b'MMCATLG1'
+    VERSION = 1
+    # magic, version, byte order, movie count, string count
+    HEADER = struct.Struct('<8sIBxxxII')
+    SECTION = struct.Struct('<QQ')
+    ALIGNMENT = 8
+
+    # Sentinel stored for a missing year, runtime or vote count
+    NONE_INT = -2 ** 31
+    CAST_ROLES = ('actor', 'actress', 'director')
+
+    # (name, typecode) of every section, in file order
+    SECTIONS = (
+        ('string_offsets', 'I'),
+        ('strings', 'B'),
+        ('id', 'I'),
+        ('title', 'I'),
+        ('year', 'i'),
+        ('runtime', 'i'),
+        ('rating', 'd'),
+        ('votes', 'q'),
+        ('genres_offsets', 'I'),
+        ('genres', 'I'),
+    ) + tuple(
+        section
+        for role in CAST_ROLES
+        for section in ((f'{role}_offsets', 'I'), (role, 'I'))
+    )
+
+    def __init__(self, path):
+        """Map the catalog at path. Use MovieCatalog.open to create one."""
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = view = memoryview(self._map)
+
+        magic, version, big_endian, self._count, self._string_count = MovieCatalog.HEADER.unpack_from(view)
+        if magic != MovieCatalog.MAGIC or version != MovieCatalog.VERSION:
+            raise ValueError(f"{path} is not a version {MovieCatalog.VERSION} movie catalog")
+        if big_endian != (sys.byteorder == 'big'):
+            raise ValueError(f"{path} was written with a different byte order")
+
+        self._columns = {}
+        position = MovieCatalog.HEADER.size
+        for name, typecode in MovieCatalog.SECTIONS:
+            offset, length = MovieCatalog.SECTION.unpack_from(view, position)
+            position += MovieCatalog.SECTION.size
+            self._columns[name] = view[offset:offset + length].cast(typecode)
+
+        self._string_offsets = self._columns['string_offsets']
+        self._strings = self._columns['strings']
+
+    @staticmethod
+    def open(path):
+        """Open the catalog at path, or return None if it does not exist."""
+        if not os.path.exists(path):
+            return None
+        return MovieCatalog(path)
+
+    def __len__(self):
+        return self._count
+
+    def column(self, name):
+        """Return the typed memoryview of a numeric column such as 'year' or 'votes'."""
+        return self._columns[name]
+
+    def string(self, string_id):
+        """Decode one entry of the string table."""
+        start = self._string_offsets[string_id]
+        end = self._string_offsets[string_id + 1] - 1
+        return str(self._strings[start:end], 'utf-8')
+
+    def strings(self):
+        """Decode the whole string table at once into a list indexed by string id."""
+        return str(self._strings, 'utf-8').split('\0')[:-1]
+
+    def rows(self):
+        """Yield (id, title, year, runtime, genres, rating, votes, cast) for every movie.
+
+        This is the fast path for loading the whole catalog: strings are
+        decoded once and shared, and columns are converted in bulk. cast
+        maps each role in CAST_ROLES to a list of names.
+        """
+        strings = self.strings()
+        columns = {name: column.tolist() for name, column in self._columns.items() if name != 'strings'}
+        none_int = MovieCatalog.NONE_INT
+
+        def lists(name):
+            offsets = columns[f'{name}_offsets']
+            values = [strings[s] for s in columns[name]]
+            return [values[offsets[i]:offsets[i + 1]] for i in range(self._count)]
+
+        genres = lists('genres')
+        cast = [lists(role) for role in MovieCatalog.CAST_ROLES]
+        for i, (string_id, title_id, year, runtime, rating, votes) in enumerate(zip(
+                columns['id'], columns['title'], columns['year'], columns['runtime'],
+                columns['rating'], columns['votes'])):
+            yield (
+                strings[string_id],
+                strings[title_id],
+                None if year == none_int else year,
+                None if runtime == none_int else runtime,
+                genres[i],
+                None if rating != rating else rating,
+                None if votes == none_int else votes,
+                {role: people[i] for role, people in zip(MovieCatalog.CAST_ROLES, cast)},
+            )
+
+    def string_ids(self, name, i):
+        """Return the string ids of movie i in a list section ('genres' or a cast role)."""
+        offsets = self._columns[f'{name}_offsets']
+        return self._columns[name][offsets[i]:offsets[i + 1]]
+
+    def _int(self, name, i):
+        value = self._columns[name][i]
+        return None if value == MovieCatalog.NONE_INT else value
+
+    def record(self, i):
+        """Return movie i as a movies.json record."""
+        rating = self._columns['rating'][i]
+        return {
+            'id': self.string(self._columns['id'][i]),
+            'title': self.string(self._columns['title'][i]),
+            'year': self._int('year', i),
+            'runtime': self._int('runtime', i),
+            'genres': [self.string(s) for s in self.string_ids('genres', i)],
+            'rating': None if math.isnan(rating) else rating,
+            'votes': self._int('votes', i),
+            'cast': {role: [self.string(s) for s in self.string_ids(role, i)] for role in MovieCatalog.CAST_ROLES},
+        }
+
+    def records(self):
+        """Return every movie as an ordered {id: record} dict, like movies.json."""
+        fields = ('id', 'title', 'year', 'runtime', 'genres', 'rating', 'votes', 'cast')
+        return {row[0]: dict(zip(fields, row)) for row in self.rows()}
+
+    def close(self):
+        """Release the column views and unmap the file."""
+        for column in self._columns.values():
+            column.release()
+        self._columns = {}
+        self._view.release()
+        self._map.close()
+
+    @staticmethod
+    def write(path, movies_dict):
+        """Write a {id: record} dict, as saved to movies.json, to a catalog file at path."""
+        string_ids = {}
+        string_offsets = array('I', [0])
+        strings = bytearray()
+
+        def intern(text):
+            string_id = string_ids.get(text)
+            if string_id is None:
+                if '\0' in text:
+                    raise ValueError(f"NUL character in {text!r}")
+                string_id = string_ids[text] = len(string_offsets) - 1
+                strings.extend(text.encode('utf-8'))
+                strings.append(0)
+                string_offsets.append(len(strings))
+            return string_id
+
+        def as_int(value):
+            return MovieCatalog.NONE_INT if value is None else value
+
+        columns = {name: array(typecode) for name, typecode in MovieCatalog.SECTIONS if typecode != 'B'}
+        for name in ('genres',) + MovieCatalog.CAST_ROLES:
+            columns[f'{name}_offsets'].append(0)
+
+        for movie_id, data in movies_dict.items():
+            columns['id'].append(intern(movie_id))
+            columns['title'].append(intern(data.get('title') or ''))
+            columns['year'].append(as_int(data.get('year')))
+            columns['runtime'].append(as_int(data.get('runtime')))
+            rating = data.get('rating')
+            columns['rating'].append(math.nan if rating is None else rating)
+            columns['votes'].append(as_int(data.get('votes')))
+
+            columns['genres'].extend(intern(genre) for genre in data.get('genres') or [])
+            columns['genres_offsets'].append(len(columns['genres']))
+            cast = data.get('cast') or {}
+            for role in MovieCatalog.CAST_ROLES:
+                columns[role].extend(intern(name) for name in cast.get(role, []))
+                columns[f'{role}_offsets'].append(len(columns[role]))
+
+        columns['string_offsets'] = string_offsets
+        payloads = [strings if name == 'strings' else columns[name].tobytes()
+                    for name, _ in MovieCatalog.SECTIONS]
+
+        header = MovieCatalog.HEADER.pack(MovieCatalog.MAGIC, MovieCatalog.VERSION,
+                                          sys.byteorder == 'big', len(movies_dict), len(string_ids))
+        position = len(header) + MovieCatalog.SECTION.size * len(payloads)
+        table = bytearray()
+        layout = []
+        for payload in payloads:
+            position += -position % MovieCatalog.ALIGNMENT
+            table += MovieCatalog.SECTION.pack(position, len(payload))
+            layout.append(position)
+            position += len(payload)
+
+        # Write to a temporary file and rename so readers never map a partial catalog
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(header)
+            f.write(table)
+            for offset, payload in zip(layout, payloads):
+                f.write(b'\0' * (offset - f.tell()))
+                f.write(payload)
+        os.replace(temp_path, path)
@@ -0,0 +1,213 @@
+from array import array
+import bisect
+
+import numpy as np
+
+from metrics import Metrics
+from person_index import PersonIndex
+from text_search import ngrams
+
+
+# Number of votes at which a movie's rating is trusted at half weight.
+VOTE_CONFIDENCE = 5000
+
+# Positions of the set bits in every possible byte, used to expand bitsets.
+_BYTE_BITS = [tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+
+
+def weighted_rating(movie):
+    """Rating adjusted by vote count, used to rank search results."""
+    rating = movie.rating or 0
+    votes = movie.votes or 0
+    # Weighted formula: higher votes increase confidence in the rating
+    # Uses (votes / votes + 5000) * rating to balance rating and vote count
+    return (votes / (votes + VOTE_CONFIDENCE)) * rating
+
+
+class MovieIndex:
+    """Per-field search indexes built once over the cached movie catalog.
+
+    Every movie is addressed by its position in the catalog list. Genre,
+    year and rating filters are stored as integer bitsets over those
+    positions so they can be combined with a single AND, while title and
+    cast filters use trigram postings that are verified against the
+    lowercased title or, through a PersonIndex, the normalized name.
+    """
+
+    def __init__(self, movies):
+        """Build the indexes for the given list of Movies."""
+        self._movies = list(movies)
+        self._all_bits = (1 << len(self._movies)) - 1
+        self._weighted = [weighted_rating(movie) for movie in self._movies]
+        # Every position, best weighted rating first (ties keep catalog order),
+        # and the rank of every position in that order
+        self._ranked = sorted(range(len(self._movies)), key=lambda p: -self._weighted[p])
+        self._ranked_array = np.array(self._ranked, dtype=np.int64)
+        self._rank = np.empty(len(self._movies), dtype=np.int64)
+        self._rank[self._ranked_array] = np.arange(len(self._movies))
+
+        self._titles = []
+        self._title_grams = {}
+        self._genre_bits = {}
+        self._year_bits = {}
+        self.people = PersonIndex(self._movies)
+
+        rating_bits = {}
+
+        for position, movie in enumerate(self._movies):
+            bit = 1 << position
+
+            title = (movie.title or '').lower()
+            self._titles.append(title)
+            for gram in ngrams(title):
+                self._title_grams.setdefault(gram, array('i')).append(position)
+
+            for genre in movie.genres or []:
+                self._genre_bits[genre] = self._genre_bits.get(genre, 0) | bit
+
+            if movie.year is not None:
+                self._year_bits[movie.year] = self._year_bits.get(movie.year, 0) | bit
+
+            if movie.rating is not None:
+                rating_bits[movie.rating] = rating_bits.get(movie.rating, 0) | bit
+
+        # Sorted rating array with, for each rating, the bitset of every
+        # movie rated at least that much.
+        self._ratings = sorted(rating_bits)
+        self._rating_at_least = [0] * len(self._ratings)
+        cumulative = 0
+        for i in range(len(self._ratings) - 1, -1, -1):
+            cumulative |= rating_bits[self._ratings[i]]
+            self._rating_at_least[i] = cumulative
+
+    def __len__(self):
+        return len(self._movies)
+
+    @staticmethod
+    def _bits_to_positions(bits):
+        """Expand a bitset into the ascending list of its set positions."""
+        positions = []
+        data = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+        for byte_index, byte in enumerate(data):
+            if byte:
+                base = byte_index << 3
+                positions.extend(base + bit for bit in _BYTE_BITS[byte])
+        return positions
+
+    def _match_text(self, query, texts, grams):
+        """Return the ids of texts containing query, using the rarest query n-gram."""
+        query_grams = ngrams(query)
+        if not query_grams:
+            # Too short for the n-gram index, check every text directly
+            return [i for i, text in enumerate(texts) if query in text]
+
+        postings = [grams.get(gram) for gram in query_grams]
+        if any(posting is None for posting in postings):
+            return []
+        rarest = min(postings, key=len)
+        return [i for i in rarest if query in texts[i]]
+
+    def _match_title(self, title):
+        """Return the set of positions whose title contains the query."""
+        return set(self._match_text(title, self._titles, self._title_grams))
+
+    def _match_cast(self, cast):
+        """Return the set of positions with a cast member whose name contains the query."""
+        return self.people.positions(self.people.containing(cast))
+
+    def movies_with_person(self, name, roles=PersonIndex.CAST_ROLES):
+        """Return the movies crediting the named person in any of roles, in catalog order."""
+        positions = self.people.positions(self.people.exact(name), roles)
+        return [self._movies[p] for p in sorted(positions)]
+
+    def _rating_bits(self, min_rating):
+        """Return the bitset of movies rated at least min_rating."""
+        i = bisect.bisect_left(self._ratings, min_rating)
+        if i == len(self._ratings):
+            return 0
+        return self._rating_at_least[i]
+
+    def search(self, title='', genre='', year='', cast='', rating='', limit=None):
+        """Return movies matching every given filter, best weighted rating first.
+
+        The filters follow the /search form: title and cast are lowercase
+        substrings, genre is an exact genre name, year an exact release
+        year and rating a minimum rating. Year and rating values that do
+        not parse are ignored. Only the first limit results are returned.
+        """
+        with Metrics.timer('search.filter'):
+            bits, candidates = self._filter(title, genre, year, cast, rating)
+        with Metrics.timer('search.rank'):
+            return self._select(bits, candidates, limit)
+
+    def _filter(self, title, genre, year, cast, rating):
+        """Apply the filters of search.
+
+        Returns (bits, candidates): the bitmap of movies passing the genre,
+        year and rating filters, and the positions matching title and cast,
+        or None if neither was given.
+        """
+        bits = self._all_bits
+
+        if genre:
+            bits &= self._genre_bits.get(genre, 0)
+
+        if year:
+            try:
+                bits &= self._year_bits.get(int(year), 0)
+            except (ValueError, TypeError):
+                pass
+
+        if rating:
+            try:
+                rating_float = float(rating)
+                # NaN never compares lower than a rating, so it filters nothing
+                if rating_float == rating_float:
+                    bits &= self._rating_bits(rating_float)
+            except (ValueError, TypeError):
+                pass
+
+        candidates = None
+        if title:
+            candidates = self._match_title(title)
+        if cast:
+            cast_matches = self._match_cast(cast)
+            candidates = cast_matches if candidates is None else candidates & cast_matches
+        return bits, candidates
+
+    def _select(self, bits, candidates, limit):
+        """Return the best ranked limit movies among the matches of _filter."""
+        if candidates is None and limit is not None and bits.bit_count() > 8 * limit:
+            # Enough matches that walking the ranked order finds the top
+            # results long before the end, stopping as soon as it has them
+            data = bits.to_bytes((len(self._movies) + 7) // 8, 'little')
+            results = []
+            for p in self._ranked:
+                if data[p >> 3] >> (p & 7) & 1:
+                    results.append(self._movies[p])
+                    if len(results) == limit:
+                        break
+            return results
+
+        if candidates is None:
+            positions = MovieIndex._bits_to_positions(bits)
+        elif bits == self._all_bits:
+            positions = list(candidates)
+        else:
+            data = bits.to_bytes((len(self._movies) + 7) // 8, 'little')
+            positions = [p for p in candidates if data[p >> 3] >> (p & 7) & 1]
+
+        return [self._movies[p] for p in self._top(positions, limit)]
+
+    def _top(self, positions, limit):
+        """Return the best ranked limit positions (all with limit None), best first."""
+        if not positions:
+            return []
+        # Ranks are unique, so ordering by rank is ordering by (-weighted, position)
+        ranks = self._rank[np.fromiter(positions, dtype=np.int64, count=len(positions))]
+        if limit is not None and len(ranks) > limit:
+            if limit <= 0:
+                return []
+            ranks = np.partition(ranks, limit - 1)[:limit]
+        ranks.sort()
+        return self._ranked_array[ranks].tolist()
@@ -0,0 +1,159 @@
+from array import array
+
+
+class MovieTable:
+    """Shared columnar storage behind a set of Movies objects.
+
+    Numeric fields are kept in parallel typed arrays indexed by row, and
+    genres, cast and directors are stored as interned ids in flat arrays
+    with per-row offsets. Genre and person names are held once in shared
+    name tables no matter how many movies reference them.
+    """
+
+    # Sentinel stored for a missing year, runtime or vote count
+    NONE_INT = -2 ** 31
+
+    def __init__(self):
+        """Create an empty table."""
+        self.years = array('i')
+        self.runtimes = array('i')
+        self.ratings = array('d')
+        self.votes = array('q')
+
+        self.genre_names = []
+        self._genre_ids = {}
+        self.person_names = []
+        self._person_ids = {}
+
+        self._genres = array('H')
+        self._genre_offsets = array('I', [0])
+        self._cast = array('I')
+        self._cast_offsets = array('I', [0])
+        # How many of each row's cast are actors; the rest are actresses
+        self._actor_counts = array('I')
+        self._directors = array('I')
+        self._director_offsets = array('I', [0])
+
+    def __len__(self):
+        return len(self.years)
+
+    @staticmethod
+    def from_catalog(catalog):
+        """Build a table holding every movie of a MovieCatalog, row i being catalog movie i.
+
+        Columns are copied in bulk and the catalog's decoded string table is
+        used as the person name table, so no name is interned one by one.
+        """
+        table = MovieTable()
+        for column, name in ((table.years, 'year'), (table.runtimes, 'runtime'),
+                             (table.ratings, 'rating'), (table.votes, 'votes')):
+            column.frombytes(catalog.column(name).tobytes())
+
+        strings = catalog.strings()
+        table.person_names = strings
+        # Only needed if more movies are added, so built on first use
+        table._person_ids = None
+
+        for string_id in catalog.column('genres'):
+            name = strings[string_id]
+            table._genres.append(MovieTable._intern(name, table.genre_names, table._genre_ids))
+        table._genre_offsets = array('I', catalog.column('genres_offsets'))
+
+        # Cast is the actors followed by the actresses of each movie
+        actors = catalog.column('actor')
+        actor_offsets = catalog.column('actor_offsets').tolist()
+        actresses = catalog.column('actress')
+        actress_offsets = catalog.column('actress_offsets').tolist()
+        for row in range(len(catalog)):
+            table._cast.frombytes(actors[actor_offsets[row]:actor_offsets[row + 1]].tobytes())
+            table._cast.frombytes(actresses[actress_offsets[row]:actress_offsets[row + 1]].tobytes())
+            table._cast_offsets.append(len(table._cast))
+            table._actor_counts.append(actor_offsets[row + 1] - actor_offsets[row])
+
+        table._directors.frombytes(catalog.column('director').tobytes())
+        table._director_offsets = array('I', catalog.column('director_offsets'))
+        return table
+
+    @staticmethod
+    def _intern(name, names, ids):
+        """Return the id of name in a name table, adding it if needed."""
+        name_id = ids.get(name)
+        if name_id is None:
+            name_id = ids[name] = len(names)
+            names.append(name)
+        return name_id
+
+    def add(self, year, runtime, rating, votes, genres, cast, directors, actor_count=None):
+        """Append one movie's fields and return its row number.
+
+        cast lists the actors before the actresses, actor_count being the
+        number of actors (all of cast if not given).
+        """
+        if self._person_ids is None:
+            self._person_ids = {name: i for i, name in enumerate(self.person_names)}
+
+        none_int = MovieTable.NONE_INT
+        self.years.append(none_int if year is None else year)
+        self.runtimes.append(none_int if runtime is None else runtime)
+        self.ratings.append(float('nan') if rating is None else rating)
+        self.votes.append(none_int if votes is None else votes)
+
+        self._genres.extend(MovieTable._intern(genre, self.genre_names, self._genre_ids) for genre in genres or [])
+        self._genre_offsets.append(len(self._genres))
+        self._cast.extend(MovieTable._intern(name, self.person_names, self._person_ids) for name in cast or [])
+        self._cast_offsets.append(len(self._cast))
+        self._actor_counts.append(len(cast or []) if actor_count is None else actor_count)
+        self._directors.extend(
+            MovieTable._intern(name, self.person_names, self._person_ids) for name in directors or [])
+        self._director_offsets.append(len(self._directors))
+        return len(self.years) - 1
+
+    def _int(self, column, row):
+        value = column[row]
+        return None if value == MovieTable.NONE_INT else value
+
+    def year(self, row):
+        return self._int(self.years, row)
+
+    def runtime(self, row):
+        return self._int(self.runtimes, row)
+
+    def rating(self, row):
+        value = self.ratings[row]
+        return None if value != value else value
+
+    def vote_count(self, row):
+        return self._int(self.votes, row)
+
+    def genre_ids(self, row):
+        """Return the interned genre ids of a row."""
+        return self._genres[self._genre_offsets[row]:self._genre_offsets[row + 1]]
+
+    def genres(self, row):
+        names = self.genre_names
+        return [names[i] for i in self.genre_ids(row)]
+
+    def cast_ids(self, row):
+        """Return the interned person ids of a row's cast."""
+        return self._cast[self._cast_offsets[row]:self._cast_offsets[row + 1]]
+
+    def cast(self, row):
+        names = self.person_names
+        return [names[i] for i in self.cast_ids(row)]
+
+    def actors(self, row):
+        names = self.person_names
+        start = self._cast_offsets[row]
+        return [names[i] for i in self._cast[start:start + self._actor_counts[row]]]
+
+    def actresses(self, row):
+        names = self.person_names
+        return [names[i] for i in self._cast[self._cast_offsets[row] + self._actor_counts[row]:self._cast_offsets[row + 1]]]
+
+    def director_ids(self, row):
+        """Return the interned person ids of a row's directors."""
+        return self._directors[self._director_offsets[row]:self._director_offsets[row + 1]]
+
+    def directors(self, row):
+        names = self.person_names
+        return [names[i] for i in self.director_ids(row)]
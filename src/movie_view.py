@@ -0,0 +1,17 @@
+class MovieView:
+    """A read-only view of a Movies object for one request.
+
+    Carries per-request data, such as the current user's review of the
+    movie, so the cached Movies objects shared between requests are never
+    modified. Every other attribute is read from the movie itself.
+    """
+
+    __slots__ = ('movie', 'user_review')
+
+    def __init__(self, movie, user_review=None):
+        """Wrap movie, with the current user's review of it if they wrote one."""
+        self.movie = movie
+        self.user_review = user_review
+
+    def __getattr__(self, name):
+        return getattr(self.movie, name)
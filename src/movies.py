@@ -1,41 +1,143 @@
 import json
 import os
-import gzip
-import csv
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import imdb_pipeline
+from IMDBDownloader import DownloadError
+from metrics import Metrics
+from movie_catalog import MovieCatalog
+from movie_index import MovieIndex
+from movie_table import MovieTable
+from movie_view import MovieView
+from recommender import Recommender
 from review import Review
-from user import User
+from shared_cache import SharedCache
+from text_search import normalize_name
+from title_suggester import TitleSuggester
 
 class Movies:
-    temp_status = None
     """FileDB class for handling file-based database operations."""
+    # Each movie only holds its id and title; every other field lives in a
+    # row of a MovieTable shared by the whole catalog
+    __slots__ = ('id', 'title', '_table', '_row')
+    # Only set on the MovieView of a movie, see annotate_user_reviews
+    user_review = None
+
     MOVIES_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'movies.json') 
+    # Columnar catalog that replaces movies.json, which is only kept as a debug export
+    CATALOG_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'movies.bin')
+    # Per-movie content hashes of the last IMDb run, and the movies it changed
+    HASHES_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'movies.hashes.json')
+    CHANGES_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'movies.changes.json')
+    # Sequence number of the last published change, written after CHANGES_FILE
+    # so running apps can check for changes without parsing them
+    SEQUENCE_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'movies.sequence')
+    # Seconds between checks for a new catalog by the catalog watcher thread
+    CATALOG_WATCH_INTERVAL = 5
     RECOMMENDATION_LIMIT = 5
-    # Cache for expensive operations
-    _movies_cache = None
-    _genres_cache = None
-    _cache_version = 0
+    # Neighbours shown on a movie card, and the review rating counted as liking a movie
+    SIMILAR_LIMIT = 3
+    LIKED_RATING = 7.0
+    # Cache for expensive operations, safe to share between threads. The
+    # catalog is a (movies, {id: movie}) snapshot that is replaced as a
+    # whole, and everything built from it is rebuilt for a new snapshot.
+    _catalog_cache = SharedCache(lambda key: Movies._load_catalog(), 'catalog')
+    _genres_cache = SharedCache(lambda catalog: Movies._build_genres(catalog), 'genres')
+    _index_cache = SharedCache(lambda catalog: Movies._build_index(catalog), 'index')
+    _recommender_cache = SharedCache(lambda catalog: Movies._build_recommender(catalog), 'recommender')
+    _suggester_cache = SharedCache(lambda catalog: Movies._build_suggester(catalog), 'suggester')
+    # Ranked movie ids of recent searches as {filters: (cached_at, ids)},
+    # least recently used first, valid for the catalog snapshot they were
+    # computed on. _search_lock guards all of these.
+    _search_lock = threading.Lock()
+    _search_cache = OrderedDict()
+    _search_cache_catalog = None
+    _search_cache_hits = 0
+    _search_cache_misses = 0
+    SEARCH_CACHE_SIZE = 1024
+    SEARCH_CACHE_SECONDS = 300
+    # Held while applying catalog changes, so only one thread does it
+    _changes_lock = threading.Lock()
+    _changes_sequence = 0
+    # Set when a snapshot was swapped in, so the next check drops the one it replaced
+    _swapped = False
+    # (inode, mtime, size) of the catalog file the cached catalog came from
+    _catalog_stamp = None
+    # Process running the catalog watcher thread, which forks do not
+    # inherit, or whose watcher was disabled
+    _watcher_pid = None
+    _watcher_lock = threading.Lock()
 
     "-""Initialize the FileDB with the given file path."""
     __data_dir = 'data'
     __imdb_dir = os.path.join(__data_dir, "imdb")
     os.makedirs(__data_dir, exist_ok=True)
     os.makedirs(__imdb_dir, exist_ok=True)   
+    # Where IMDBDownloader should put the dumps
+    IMDB_DIR = __imdb_dir
+
+    def __init__(self, movie_id, title, year, genres, runtime, rating, votes, cast, directors, table=None,
+                 actor_count=None):
+        """Create a movie, storing its fields in table (a new MovieTable if not given).
 
-    def __init__(self, movie_id, title, year, genres, runtime, rating, votes, cast, directors):
+        cast lists the actors before the actresses, actor_count being the
+        number of actors (all of cast if not given).
+        """
         self.id = movie_id
         self.title = title
-        self.year = year
-        self.genres = genres
-        self.runtime = runtime
-        self.rating = rating
-        self.votes = votes
-        self.cast = cast
-        self.directors = directors
-        
+        self._table = table if table is not None else MovieTable()
+        self._row = self._table.add(year, runtime, rating, votes, genres, cast, directors, actor_count)
+
+    @staticmethod
+    def _from_row(movie_id, title, table, row):
+        """Create a movie for a row that is already stored in table."""
+        movie = Movies.__new__(Movies)
+        movie.id = movie_id
+        movie.title = title
+        movie._table = table
+        movie._row = row
+        return movie
+
+    @property
+    def year(self):
+        return self._table.year(self._row)
+
+    @property
+    def runtime(self):
+        return self._table.runtime(self._row)
+
+    @property
+    def rating(self):
+        return self._table.rating(self._row)
+
+    @property
+    def votes(self):
+        return self._table.vote_count(self._row)
+
+    @property
+    def genres(self):
+        return self._table.genres(self._row)
+
+    @property
+    def cast(self):
+        return self._table.cast(self._row)
+
+    @property
+    def actors(self):
+        return self._table.actors(self._row)
+
+    @property
+    def actresses(self):
+        return self._table.actresses(self._row)
 
+    @property
+    def directors(self):
+        return self._table.directors(self._row)
 
     @staticmethod
-    def from_json(movie_id, data):
+    def from_json(movie_id, data, table=None):
         all_cast = data.get("cast")
         acting_cast = all_cast["actor"] + all_cast["actress"]
         
@@ -49,7 +151,9 @@ class Movies:
             rating=data.get("rating"),
             votes=data.get("votes"),
             cast= acting_cast,
-            directors=all_cast["director"]
+            directors=all_cast["director"],
+            table=table,
+            actor_count=len(all_cast["actor"])
         )
 
     def to_json(self):
@@ -63,252 +167,593 @@ class Movies:
             "votes": self.votes
         }
     
+    @staticmethod
+    def _load_catalog():
+        # Changes published so far are already part of the saved catalog.
+        # One published while loading looks new to the next refresh, which
+        # then reloads, as the change's base is not the catalog loaded here
+        Movies._changes_sequence = Movies._read_changes_sequence()
+        while True:
+            stamp = Movies._read_catalog_stamp()
+            movies = Movies.get_all_movies()
+            # Load again if the catalog was replaced meanwhile, so the
+            # stamp is that of the catalog loaded
+            if Movies._read_catalog_stamp() == stamp:
+                break
+        Movies._catalog_stamp = stamp
+        # Keyed store built alongside the list for O(1) lookups by id
+        return movies, {movie.id: movie for movie in movies}
+
+    @staticmethod
+    def get_cached_catalog():
+        """Get the current (movies, {id: movie}) catalog snapshot, loading it on first use."""
+        return Movies._catalog_cache.get()
+
+    @staticmethod
+    def start_catalog_watcher(interval=CATALOG_WATCH_INTERVAL):
+        """Check for a new catalog every interval seconds in a background thread.
+
+        A catalog saved by process_imdb.py is then loaded, and its indexes
+        built, off the request path; requests never reload it themselves.
+        Does nothing if this process already has a watcher or disabled it,
+        so the app calls it on every request.
+        """
+        if Movies._watcher_pid == os.getpid():
+            return
+        with Movies._watcher_lock:
+            if Movies._watcher_pid == os.getpid():
+                return
+            Movies._watcher_pid = os.getpid()
+        threading.Thread(target=Movies._watch_catalog, args=(interval,), name="catalog watcher", daemon=True).start()
+
+    @staticmethod
+    def disable_catalog_watcher():
+        """Keep this process from starting a catalog watcher.
+
+        For processes whose catalog is swapped some other way, like
+        serve.py's workers, which the parent replaces with new ones.
+        """
+        Movies._watcher_pid = os.getpid()
+
+    @staticmethod
+    def _watch_catalog(interval):
+        while True:
+            time.sleep(interval)
+            try:
+                Movies.refresh_catalog()
+            except Exception as e:
+                # Keep serving the current catalog and try again later
+                print(f"Error reloading the catalog: {e}")
+
     @staticmethod
     def get_cached_movies():
         """Get movies with caching."""
-        if Movies._movies_cache is None:
-            print("Loading movies from disk...")
-            Movies._movies_cache = Movies.get_all_movies()
-            Movies._cache_version += 1
-        return Movies._movies_cache
-    
+        return Movies.get_cached_catalog()[0]
+
+    @staticmethod
+    def _build_genres(catalog):
+        return Movies._collect_genres(catalog[0])
+
     @staticmethod
     def get_cached_genres():
         """Get genres with caching."""
-        if Movies._genres_cache is None:
-            print("Loading genres...")
-            Movies._genres_cache = Movies.get_genres()
-        return Movies._genres_cache     
+        return Movies._genres_cache.get(Movies.get_cached_catalog())
 
-    def _process_imdb_data():
-        """Process IMDb data files with ratings, cast, and proper filtering using csv.DictReader."""
-        print("Processing IMDb data files...")
-        
-        # Define file paths
-        title_basics_file = os.path.join(Movies.__imdb_dir, "title.basics.tsv.gz")
-        title_ratings_file = os.path.join(Movies.__imdb_dir, "title.ratings.tsv.gz")
-        name_basics_file = os.path.join(Movies.__imdb_dir, "name.basics.tsv.gz")
-        title_principals_file = os.path.join(Movies.__imdb_dir, "title.principals.tsv.gz")
-        title_crew_file = os.path.join(Movies.__imdb_dir, "title.crew.tsv.gz")
-        
-        movies_data = {}
-        
+    @staticmethod
+    def _build_index(catalog):
+        return MovieIndex(catalog[0])
+
+    @staticmethod
+    def get_cached_index():
+        """Get the search index, rebuilt whenever the movie cache is reloaded."""
+        return Movies._index_cache.get(Movies.get_cached_catalog())
+
+    @staticmethod
+    def _build_recommender(catalog):
+        return Recommender(catalog[0])
+
+    @staticmethod
+    def get_cached_recommender():
+        """Get the recommendation scorer, rebuilt whenever the movie cache is reloaded."""
+        return Movies._recommender_cache.get(Movies.get_cached_catalog())
+
+    @staticmethod
+    def _build_suggester(catalog):
+        return TitleSuggester(catalog[0])
+
+    @staticmethod
+    def get_cached_suggester():
+        """Get the title autocomplete index, rebuilt whenever the movie cache is reloaded."""
+        return Movies._suggester_cache.get(Movies.get_cached_catalog())
+
+    @staticmethod
+    def _imdb_source(filename, sources=None):
+        """Return where to read an IMDb dump from: its entry in sources, else its path in IMDB_DIR."""
+        if sources and filename in sources:
+            return sources[filename]
+        return os.path.join(Movies.__imdb_dir, filename)
+
+    @staticmethod
+    def _read_source(read, source, *args):
+        """Run a pipeline reader on a path or a streaming download.
+
+        A download is moved into place once the reader has parsed all of
+        it, which also verified its gzip checksum, and discarded if the
+        reader failed.
+        """
+        if isinstance(source, str):
+            return read(source, *args)
         try:
-            # Step 1: Read title.ratings.tsv.gz and filter
+            result = read(source, *args)
+        except BaseException:
+            source.abort()
+            raise
+        source.commit()
+        return result
+
+    @staticmethod
+    def _read_imdb_snapshot(sources=None):
+        """Read ratings, basics and principals of the current IMDb dumps.
+
+        Returns (ratings, movies, principals): ratings maps tconst to
+        (averageRating, numVotes), movies maps each qualified tconst to its
+        basics tuple in file order and principals groups the cast rows of
+        those movies by tconst. Returns None when a required file is missing.
+
+        sources maps file names to local paths or to StreamingDownloads,
+        which are parsed while they download, in threads instead of worker
+        processes.
+        """
+        title_basics_file = Movies._imdb_source("title.basics.tsv.gz", sources)
+        title_ratings_file = Movies._imdb_source("title.ratings.tsv.gz", sources)
+        title_principals_file = Movies._imdb_source("title.principals.tsv.gz", sources)
+
+        for path in (title_ratings_file, title_basics_file):
+            if isinstance(path, str) and not os.path.exists(path):
+                print(f"Error: {path} not found")
+                return None
+
+        # Downloads cannot be handed to other processes
+        streaming = not all(isinstance(source, str) for source in (sources or {}).values())
+        executor = ThreadPoolExecutor if streaming else ProcessPoolExecutor
+        # Each stage filters on the one before it, so they run one at a time
+        with executor(max_workers=1) as pool:
+            # Step 1: Read title.ratings.tsv.gz
             print("Step 1: Reading title.ratings.tsv.gz...")
-            if not os.path.exists(title_ratings_file):
-                print(f"Error: {title_ratings_file} not found")
-                return {}
-            
-            df_ratings = {}
-            total_ratings = 0
-            
-            with gzip.open(title_ratings_file, 'rt', encoding='utf-8') as f:
-                reader = csv.DictReader(f, delimiter='\t')
-                for row in reader:
-                    total_ratings += 1
-                    try:
-                        num_votes = int(row['numVotes'])
-                        # Only keep ratings with at least 1000 votes
-                        if num_votes >= 1000:
-                            df_ratings[row['tconst']] = {
-                                'averageRating': float(row['averageRating']),
-                                'numVotes': num_votes
-                            }
-                    except (ValueError, KeyError):
-                        continue
-            
+            if streaming:
+                df_ratings, total_ratings = pool.submit(
+                    Movies._read_source, imdb_pipeline.read_ratings, title_ratings_file).result()
+            else:
+                df_ratings, total_ratings = pool.submit(imdb_pipeline.read_ratings, title_ratings_file).result()
+
             print(f"  Total ratings: {total_ratings}")
-            print(f"  After numVotes>=1000 filter: {len(df_ratings)}")
-            
-            # Create set of movie IDs with good ratings for faster lookup
-            rated_movie_ids = set(df_ratings.keys())
-            
-            # Step 2: Read title.basics.tsv.gz
-            print("Step 2: Reading title.basics.tsv.gz...")
-            if not os.path.exists(title_basics_file):
-                print(f"Error: {title_basics_file} not found")
-                return {}
-            
-            df_movies = {}
-            total_titles = 0
-            
-            with gzip.open(title_basics_file, 'rt', encoding='utf-8') as f:
-                reader = csv.DictReader(f, delimiter='\t')
-                for row in reader:
-                    total_titles += 1
-                    
-                    try:
-                        movie_id = row['tconst']
-                        
-                        # Skip if not a movie
-                        if row['titleType'] != 'movie':
-                            continue
-                        
-                        # Skip adult content
-                        if row['isAdult'] == '1':
-                            continue
-                        
-                        # Skip if no year
-                        if row['startYear'] == '\\N':
-                            continue
-                        
-                        # Skip if doesn't have ratings
-                        if movie_id not in rated_movie_ids:
-                            continue
-                        
-                        try:
-                            year = int(row['startYear'])
-                            runtime = int(row['runtimeMinutes']) if row['runtimeMinutes'] != '\\N' else None
-                        except (ValueError, KeyError):
-                            continue
-                        
-                        genres = row['genres'].split(',') if row['genres'] != '\\N' else []
-                        
-                        df_movies[movie_id] = {
-                            'primaryTitle': row['primaryTitle'],
-                            'startYear': year,
-                            'runtimeMinutes': runtime,
-                            'genres': genres
-                        }
-                    except KeyError:
-                        continue
-            
+            print(f"  After numVotes>={imdb_pipeline.MIN_VOTES} filter: {len(df_ratings)}")
+
+            # Step 2: Read title.basics.tsv.gz, keeping only movies that have
+            # ratings, so the worker sends back just those
+            print("Step 2: Reading title.basics.tsv.gz for the rated titles...")
+            rated = set(df_ratings)
+            if streaming:
+                job = pool.submit(Movies._read_source, imdb_pipeline.read_basics, title_basics_file, rated)
+            else:
+                job = pool.submit(imdb_pipeline.read_basics, title_basics_file, rated)
+            basics, total_titles = job.result()
+            df_movies = {movie[0]: movie for movie in basics}
+            del basics, rated
+
             print(f"  Total titles: {total_titles}")
             print(f"  Qualified movies: {len(df_movies)}")
-            
+
+            # Step 3: Stream title.principals.tsv.gz for the qualified movies
+            principals = {}
+            if df_movies:
+                print("Step 3: Reading title.principals.tsv.gz...")
+                if isinstance(title_principals_file, str) and not os.path.exists(title_principals_file):
+                    print(f"Error: {title_principals_file} not found")
+                else:
+                    if streaming:
+                        job = pool.submit(Movies._read_source, imdb_pipeline.read_principals,
+                                          title_principals_file, set(df_movies))
+                    else:
+                        job = pool.submit(imdb_pipeline.read_principals, title_principals_file, set(df_movies))
+                    rows, total_principals = job.result()
+                    for row in rows:
+                        principals.setdefault(row[0], []).append(row)
+                    print(f"  Total principals: {total_principals}")
+                    print(f"  Cast rows for qualified movies: {len(rows)}")
+
+        return df_ratings, df_movies, principals
+
+    @staticmethod
+    def _resolve_cast(principals, sources=None):
+        """Resolve the names of the given principals and build their cast lists."""
+        # Step 4: Read name.basics.tsv.gz for the referenced people only
+        print("Step 4: Reading name.basics.tsv.gz...")
+        name_basics_file = Movies._imdb_source("name.basics.tsv.gz", sources)
+        rows = [row for movie_rows in principals.values() for row in movie_rows]
+        names_lookup = {}
+        if isinstance(name_basics_file, str) and not os.path.exists(name_basics_file):
+            print(f"Error: {name_basics_file} not found")
+        elif rows:
+            nconsts = {person_id for _, _, person_id in rows}
+            names_lookup, total_names = Movies._read_source(imdb_pipeline.read_names, name_basics_file, nconsts)
+            print(f"  Total names: {total_names}")
+            print(f"  Loaded {len(names_lookup)} of {len(nconsts)} referenced names")
+
+        cast_data = imdb_pipeline.build_cast(rows, names_lookup)
+        print(f"  Movies with cast info: {len(cast_data)}")
+        return cast_data
+
+    @staticmethod
+    def _movie_record(movie, rating, cast_info):
+        """Build the movies.json record for a basics tuple, its rating and its cast."""
+        movie_id, title, year, runtime, genres = movie
+        average_rating, num_votes = rating
+        return {
+            'id': movie_id,
+            'title': title,
+            'year': year,
+            'runtime': runtime,
+            'genres': genres,
+            'rating': average_rating,
+            'votes': num_votes,
+            'cast': cast_info
+        }
+
+    def _process_imdb_data(export_json=False, sources=None):
+        """Process IMDb data files with ratings, cast, and proper filtering.
+
+        The dumps are streamed with csv.reader one stage after another, each
+        filtering on the one before: ratings, then basics of the rated
+        titles and principals of those movies in a single worker process,
+        then, in this process, names of the people those principals
+        reference. Nothing is parsed in parallel. With sources from
+        IMDBDownloader.stream_imdb_files, each dump is parsed while it
+        downloads.
+        """
+        print("Processing IMDb data files...")
+
+        movies_data = {}
+
+        try:
+            snapshot = Movies._read_imdb_snapshot(sources)
+            if snapshot is None:
+                return {}
+            df_ratings, df_movies, principals = snapshot
+
             if not df_movies:
                 print("No movies found matching criteria")
                 return {}
-            
-            # Step 3: Read name.basics.tsv.gz
-            print("Step 3: Reading name.basics.tsv.gz...")
-            if not os.path.exists(name_basics_file):
-                print(f"Error: {name_basics_file} not found")
-                names_lookup = {}
-            else:
-                names_lookup = {}
-                total_names = 0
-                
-                with gzip.open(name_basics_file, 'rt', encoding='utf-8') as f:
-                    reader = csv.DictReader(f, delimiter='\t')
-                    for row in reader:
-                        total_names += 1
-                        try:
-                            names_lookup[row['nconst']] = row['primaryName']
-                        except KeyError:
-                            continue
-                
-                print(f"  Total names: {total_names}")
-                print(f"  Loaded {len(names_lookup)} names")
-            
-            # Step 4: Read title.principals.tsv.gz and build cast data
-            print("Step 4: Reading title.principals.tsv.gz...")
-            if not os.path.exists(title_principals_file):
-                print(f"Error: {title_principals_file} not found")
-                cast_data = {}
-            else:
-                cast_data = {}
-                total_principals = 0
-                chunk_count = 0
-                
-                with gzip.open(title_principals_file, 'rt', encoding='utf-8') as f:
-                    reader = csv.DictReader(f, delimiter='\t')
-                    for row in reader:
-                        total_principals += 1
-                        chunk_count += 1
-                        
-                        try:
-                            movie_id = row['tconst']
-                            category = row['category']
-                            person_id = row['nconst']
-                            
-                            # Skip if movie not in our list
-                            if movie_id not in df_movies:
-                                continue
-                            
-                            # Only include actor, actress, and director
-                            if category not in ['actor', 'actress', 'director']:
-                                continue
-                            
-                            # Skip if person not found
-                            if person_id not in names_lookup:
-                                continue
-                            
-                            person_name = names_lookup[person_id]
-                            
-                            # Initialize cast data for this movie
-                            if movie_id not in cast_data:
-                                cast_data[movie_id] = {
-                                    'actor': [],
-                                    'actress': [],
-                                    'director': []
-                                }
-                            
-                            # Add person to their category (avoid duplicates)
-                            if person_name not in cast_data[movie_id][category]:
-                                cast_data[movie_id][category].append(person_name)
-                        except KeyError:
-                            continue
-                        
-                        if chunk_count % 100000 == 0:
-                            print(f"  Processed {total_principals} principals, {len(cast_data)} movies with cast")
-                
-                print(f"  Total principals: {total_principals}")
-                print(f"  Movies with cast info: {len(cast_data)}")
-            
+
+            cast_data = Movies._resolve_cast(principals, sources)
+
             # Step 5: Create movie objects
             print("Step 5: Creating movie objects...")
-            for movie_id, movie_info in df_movies.items():
+            for movie_id, movie in df_movies.items():
+                # Get cast data if available
+                cast_info = cast_data.get(movie_id, {
+                    'actor': [],
+                    'actress': [],
+                    'director': []
+                })
+                movies_data[movie_id] = Movies._movie_record(movie, df_ratings[movie_id], cast_info)
+
+            # Step 6: Save the catalog
+            print(f"Step 6: Saving {len(movies_data)} movies...")
+            Movies.save_movies(movies_data, export_json)
+
+            # Record content hashes so the next refresh can be incremental
+            hashes = {
+                movie_id: imdb_pipeline.content_hashes(movie, df_ratings[movie_id], principals.get(movie_id, []))
+                for movie_id, movie in df_movies.items()
+            }
+            Movies._save_catalog_state(hashes, {'full': True})
+            print(f"✓ Successfully processed {len(movies_data)} movies")
+            return movies_data
+
+        except Exception as e:
+            print(f"Error processing IMDb data: {e}")
+            import traceback
+            traceback.print_exc()
+            return {}
+        finally:
+            Movies._close_streams(sources)
+
+    @staticmethod
+    def _close_streams(sources):
+        """Finish the downloads a run did not read, such as title.crew.tsv.gz."""
+        for source in (sources or {}).values():
+            if not isinstance(source, str) and not source.closed:
                 try:
-                    # Get cast data if available
+                    source.commit()
+                except DownloadError as e:
+                    print(f"Error: {e}")
+
+    def _refresh_imdb_data(export_json=False, sources=None):
+        """Apply only the inserts, updates and deletes since the last IMDb run.
+
+        Each movie's content hashes from the previous run are compared with
+        the new snapshot. Movies whose basics or rating changed are patched
+        in place and names are resolved only for movies whose principals
+        changed, so a person renamed on IMDb is picked up when one of their
+        movies changes or on the next full run. The changed records are
+        published in CHANGES_FILE for running apps, with the movie each
+        inserted one follows so they can keep catalog order. Falls back to a full
+        run when there is no previous state.
+        """
+        print("Refreshing IMDb data incrementally...")
+
+        try:
+            # The catalog the published changes are applied to
+            base_stamp = Movies._read_catalog_stamp()
+            old_movies = Movies.load_movie_records()
+            if not os.path.exists(Movies.HASHES_FILE) or old_movies is None:
+                print("No previous IMDb run found, processing everything...")
+                return Movies._process_imdb_data(export_json, sources)
+
+            with open(Movies.HASHES_FILE, 'r', encoding='utf-8') as f:
+                old_hashes = json.load(f)
+
+            snapshot = Movies._read_imdb_snapshot(sources)
+            if snapshot is None:
+                return {}
+            df_ratings, df_movies, principals = snapshot
+
+            if not df_movies:
+                print("No movies found matching criteria")
+                return {}
+
+            # Step 5: Diff the snapshot against the previous run
+            print("Step 5: Comparing with the previous run...")
+            hashes = {}
+            recast = {}
+            for movie_id, movie in df_movies.items():
+                movie_principals = principals.get(movie_id, [])
+                hashes[movie_id] = imdb_pipeline.content_hashes(movie, df_ratings[movie_id], movie_principals)
+                old = old_hashes.get(movie_id)
+                if old is None or movie_id not in old_movies or old[1] != hashes[movie_id][1]:
+                    recast[movie_id] = movie_principals
+            cast_data = Movies._resolve_cast(recast, sources) if recast else {}
+
+            # Step 6: Apply the changes, keeping unchanged records as they are
+            print("Step 6: Applying changes...")
+            movies_data = {}
+            upserted = {}
+            for movie_id, movie in df_movies.items():
+                if movie_id in recast:
                     cast_info = cast_data.get(movie_id, {
                         'actor': [],
                         'actress': [],
                         'director': []
                     })
-                    
-                    # Get rating data
-                    rating_info = df_ratings[movie_id]
-                    
-                    movies_data[movie_id] = {
-                        'id': movie_id,
-                        'title': movie_info['primaryTitle'],
-                        'year': movie_info['startYear'],
-                        'runtime': movie_info['runtimeMinutes'],
-                        'genres': movie_info['genres'],
-                        'rating': rating_info['averageRating'],
-                        'votes': rating_info['numVotes'],
-                        'cast': cast_info
-                    }
-                except Exception as e:
-                    print(f"Warning: Error processing movie {movie_id}: {e}")
-                    continue
-            
-            # Step 6: Save to JSON
-            print(f"Step 6: Saving {len(movies_data)} movies to JSON...")
-            Movies.save_movies(movies_data)
-            print(f"✓ Successfully processed {len(movies_data)} movies")
+                    upserted[movie_id] = Movies._movie_record(movie, df_ratings[movie_id], cast_info)
+                elif hashes[movie_id][0] != old_hashes[movie_id][0]:
+                    cast_info = old_movies[movie_id]['cast']
+                    upserted[movie_id] = Movies._movie_record(movie, df_ratings[movie_id], cast_info)
+                movies_data[movie_id] = upserted.get(movie_id) or old_movies[movie_id]
+            deleted = [movie_id for movie_id in old_movies if movie_id not in df_movies]
+            # The movie preceding each new one in the catalog, or None for the first
+            after = {}
+            previous = None
+            for movie_id in movies_data:
+                if movie_id not in old_movies:
+                    after[movie_id] = previous
+                previous = movie_id
+            inserted = sum(1 for movie_id in upserted if movie_id not in old_movies)
+
+            print(f"  Inserted: {inserted}")
+            print(f"  Updated: {len(upserted) - inserted}")
+            print(f"  Deleted: {len(deleted)}")
+
+            # Step 7: Save the catalog and publish the changed ids
+            if upserted or deleted:
+                print(f"Step 7: Saving {len(movies_data)} movies...")
+                Movies.save_movies(movies_data, export_json)
+                Movies._save_catalog_state(hashes, {'upserted': upserted, 'deleted': deleted, 'after': after,
+                                                    'base': base_stamp})
+            else:
+                print("Step 7: No changes to save")
+            print(f"✓ Successfully refreshed {len(movies_data)} movies")
             return movies_data
-            
+
         except Exception as e:
-            print(f"Error processing IMDb data: {e}")
+            print(f"Error refreshing IMDb data: {e}")
             import traceback
             traceback.print_exc()
             return {}
+        finally:
+            Movies._close_streams(sources)
+
+    @staticmethod
+    def _save_catalog_state(hashes, changes):
+        """Save the content hashes of this run and publish its changes to running apps."""
+        sequence = Movies._read_changes_sequence() + 1
+        Movies._write_json_atomic(Movies.HASHES_FILE, hashes)
+        Movies._write_json_atomic(Movies.CHANGES_FILE, dict(changes, sequence=sequence))
+        Movies._write_json_atomic(Movies.SEQUENCE_FILE, sequence)
+
+    @staticmethod
+    def _write_json_atomic(path, data):
+        """Write JSON to a temporary file and rename it over path."""
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def _read_changes_sequence():
+        """Return the sequence number of the last published catalog change, or 0."""
+        try:
+            with open(Movies.SEQUENCE_FILE, 'r', encoding='utf-8') as f:
+                return int(json.load(f))
+        except (OSError, ValueError, TypeError):
+            return 0
+
+    @staticmethod
+    def _read_catalog_stamp():
+        """Return (inode, mtime, size) of the saved catalog, or None if there is none."""
+        for path in (Movies.CATALOG_FILE, Movies.MOVIES_FILE):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            return stat.st_ino, stat.st_mtime_ns, stat.st_size
+        return None
+
+    @staticmethod
+    def refresh_catalog():
+        """Swap in a new catalog snapshot if process_imdb.py saved one; return True if it did.
+
+        Only the changed ids are replaced when the published change directly
+        follows the one already applied and was made from the catalog this
+        process loaded. After a full run, a missed change
+        or a catalog file replaced some other way, the whole catalog is
+        reloaded. The search index and the other caches already in use are
+        built for the new snapshot before it is published, so no request
+        waits for them, and requests that started on the old snapshot
+        finish on it. The snapshot replaced is dropped on the next call. A
+        thread that finds another one already refreshing returns straight
+        away.
+        """
+        if not Movies._changes_lock.acquire(blocking=False):
+            return False
+        try:
+            if Movies._swapped:
+                # Requests still on the snapshot replaced last time have finished by now
+                Movies.forget_previous_catalog()
+            catalog = Movies._refresh_catalog()
+            if catalog is None:
+                return False
+            Movies._publish_catalog(catalog)
+            Movies._swapped = True
+            return True
+        finally:
+            Movies._changes_lock.release()
+
+    @staticmethod
+    def forget_previous_catalog():
+        """Drop the snapshot replaced by the last swap, and everything built from it."""
+        for cache in (Movies._catalog_cache,) + Movies._snapshot_caches():
+            cache.forget_previous()
+        Movies._swapped = False
+
+    @staticmethod
+    def _refresh_catalog():
+        """Return a new catalog snapshot if the saved catalog changed, else None."""
+        catalog = Movies._catalog_cache.peek()
+        if catalog is None:
+            # Nothing is loaded yet, the first request loads the latest catalog
+            return None
+
+        # Only the small sequence file is read unless there is a change
+        sequence = Movies._read_changes_sequence()
+        stamp = Movies._read_catalog_stamp()
+        changes = {}
+        if sequence == Movies._changes_sequence + 1:
+            try:
+                with open(Movies.CHANGES_FILE, 'r', encoding='utf-8') as f:
+                    changes = json.load(f)
+            except (OSError, ValueError):
+                pass
+
+        # Only patch the catalog the change was made from; any other is reloaded
+        base = changes.get('base')
+        if changes.get('sequence') == sequence and 'upserted' in changes and base is not None \
+                and tuple(base) == Movies._catalog_stamp:
+            table = MovieTable()
+            upserted = {movie_id: Movies.from_json(movie_id, record, table)
+                        for movie_id, record in changes['upserted'].items()}
+            deleted = set(changes.get('deleted', []))
+            print(f"Applying {len(upserted)} updated and {len(deleted)} deleted movies...")
+            Metrics.count('catalog.patched')
+
+            # Build a new snapshot so requests holding the old one are
+            # unaffected, with new movies where a full reload puts them,
+            # since catalog order breaks ties in search
+            following = {previous: upserted.pop(movie_id)
+                         for movie_id, previous in changes.get('after', {}).items() if movie_id in upserted}
+            movies = []
+
+            def add(movie):
+                # Add the movie and the new movies that follow it
+                while movie is not None:
+                    movies.append(movie)
+                    movie = following.pop(movie.id, None)
+
+            add(following.pop(None, None))
+            for movie in catalog[0]:
+                if movie.id not in deleted:
+                    add(upserted.pop(movie.id, movie))
+            movies.extend(upserted.values())
+            while following:
+                add(following.pop(next(iter(following))))
+            Movies._changes_sequence = sequence
+            Movies._catalog_stamp = stamp
+            return movies, {movie.id: movie for movie in movies}
+
+        if sequence > Movies._changes_sequence or stamp != Movies._catalog_stamp:
+            print("Catalog changed, reloading movies...")
+            Metrics.count('catalog.reloaded')
+            with Metrics.timer('cache.catalog.build'):
+                return Movies._load_catalog()
+        return None
+
+    @staticmethod
+    def _snapshot_caches():
+        """Return the caches built from a catalog snapshot."""
+        return (Movies._genres_cache, Movies._index_cache, Movies._recommender_cache, Movies._suggester_cache)
 
     @staticmethod
-    def save_movies(movies_dict):
-        """Save movies to the JSON file."""
-        os.makedirs(os.path.dirname(Movies.MOVIES_FILE), exist_ok=True)
-        with open(Movies.MOVIES_FILE, 'w', encoding='utf-8') as f:
-            json.dump(movies_dict, f, indent=4, ensure_ascii=False)
+    def _publish_catalog(catalog):
+        """Build the caches in use for a new catalog snapshot, then publish them all together."""
+        with Metrics.timer('catalog.swap'):
+            built = [(cache, cache.build(catalog)) for cache in Movies._snapshot_caches() if cache.peek() is not None]
+            for cache, value in built:
+                cache.set(value, key=catalog)
+            Movies._catalog_cache.set(catalog)
+        print(f"Swapped in a catalog of {len(catalog[0])} movies")
+
+    @staticmethod
+    def save_movies(movies_dict, export_json=False):
+        """Save movies to the columnar catalog, and to the JSON file when export_json is set.
+
+        Without export_json any existing JSON file is removed, so it cannot
+        be loaded in place of the catalog later.
+        """
+        os.makedirs(os.path.dirname(Movies.CATALOG_FILE), exist_ok=True)
+        MovieCatalog.write(Movies.CATALOG_FILE, movies_dict)
+        if export_json:
+            with open(Movies.MOVIES_FILE, 'w', encoding='utf-8') as f:
+                json.dump(movies_dict, f, indent=4, ensure_ascii=False)
+        else:
+            # An older export would no longer match the catalog
+            try:
+                os.remove(Movies.MOVIES_FILE)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def load_movie_records():
+        """Load the saved movies as an {id: record} dict, or None if nothing was saved."""
+        catalog = MovieCatalog.open(Movies.CATALOG_FILE)
+        if catalog is not None:
+            try:
+                return catalog.records()
+            finally:
+                catalog.close()
+        if os.path.exists(Movies.MOVIES_FILE):
+            with open(Movies.MOVIES_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return None
 
     
     @staticmethod
     def get_genres():
         """Extract and return all unique genres from movies."""
-        movies = Movies.get_cached_movies()
+        return Movies._collect_genres(Movies.get_cached_movies())
+
+    @staticmethod
+    def _collect_genres(movies):
         genres_set = set()
         
         for movie in movies:
@@ -319,33 +764,96 @@ class Movies:
         
         return sorted(list(genres_set))
     
-    @staticmethod
-    def search_movies_by_genre(genre):
-        """Get movies that belong to a specific genre."""
-        movies = Movies.get_cached_movies()
-        genre_movies = []
-        
-        for movie in movies:
-            if movie.genres and genre in movie.genres:
-                genre_movies.append(movie)
-        
-        return genre_movies
-    
     @staticmethod
     def search_movies_by_cast(cast):
-        """Get movies that belong to a specific genre."""
-        movies = Movies.get_cached_movies()
-        result = []
-        
-        for movie in movies:
-            if movie.cast and cast in movie.cast:
-                result.append(movie)
-        
-        return result
+        """Get movies featuring a specific actor or actress, matched on the normalized name."""
+        return Movies.get_cached_index().movies_with_person(cast)
+
+    @staticmethod
+    def _search_key(title, genre, year, cast, rating, limit):
+        """Normalize search filters so equivalent searches share a cache entry."""
+        # Values the index would ignore become None, like an empty filter
+        try:
+            year = int(year) if year else None
+        except (ValueError, TypeError):
+            year = None
+        try:
+            rating = float(rating) if rating else None
+            if rating != rating:
+                rating = None
+        except (ValueError, TypeError):
+            rating = None
+        return ((title or '').lower(), genre or '', year, normalize_name(cast), rating, limit)
+
+    @staticmethod
+    def search_movies(title='', genre='', year='', cast='', rating='', limit=None):
+        """Search the catalog with the search index, best weighted rating first.
+
+        The ranked movie ids of each search are cached, so repeated
+        searches such as genre links skip the index. The cache holds no
+        per-user data and is emptied whenever the catalog is reloaded.
+        """
+        catalog = Movies.get_cached_catalog()
+        key = Movies._search_key(title, genre, year, cast, rating, limit)
+        now = time.monotonic()
+        with Movies._search_lock:
+            if Movies._search_cache_catalog is not catalog:
+                Movies._search_cache.clear()
+                Movies._search_cache_catalog = catalog
+            cached = Movies._search_cache.get(key)
+            if cached is not None and now - cached[0] < Movies.SEARCH_CACHE_SECONDS:
+                Movies._search_cache_hits += 1
+                Movies._search_cache.move_to_end(key)
+            else:
+                cached = None
+                Movies._search_cache_misses += 1
+        if cached is not None:
+            Metrics.count('cache.search.hit')
+            movies_by_id = catalog[1]
+            return [movies_by_id[movie_id] for movie_id in cached[1]]
+
+        Metrics.count('cache.search.miss')
+        title, genre, year, cast, rating, limit = key
+        results = Movies._index_cache.get(catalog).search(
+            title=title, genre=genre, year='' if year is None else str(year), cast=cast,
+            rating='' if rating is None else str(rating), limit=limit)
+        with Movies._search_lock:
+            # Only cache results of the catalog snapshot still in use
+            if Movies._search_cache_catalog is catalog:
+                Movies._search_cache[key] = (now, [movie.id for movie in results])
+                Movies._search_cache.move_to_end(key)
+                if len(Movies._search_cache) > Movies.SEARCH_CACHE_SIZE:
+                    Movies._search_cache.popitem(last=False)
+        return results
+
+    @staticmethod
+    def get_search_cache_stats():
+        """Get the search cache's hit and miss counts and current size."""
+        with Movies._search_lock:
+            return {
+                'hits': Movies._search_cache_hits,
+                'misses': Movies._search_cache_misses,
+                'size': len(Movies._search_cache),
+            }
     
     @staticmethod
     def get_all_movies():
-        # Check if the movies JSON file exists
+        # Prefer the columnar catalog: its columns are copied into a
+        # MovieTable in bulk, instead of parsing JSON and interning every
+        # name, and the file is unmapped once the table is built
+        catalog = MovieCatalog.open(Movies.CATALOG_FILE)
+        if catalog is not None:
+            try:
+                table = MovieTable.from_catalog(catalog)
+                strings = table.person_names
+                ids = catalog.column('id').tolist()
+                titles = catalog.column('title').tolist()
+                return [Movies._from_row(strings[ids[row]], strings[titles[row]], table, row)
+                        for row in range(len(catalog))]
+            finally:
+                catalog.close()
+
+        # Otherwise fall back to the movies JSON file, if it exists
         if os.path.exists(Movies.MOVIES_FILE):
 
             # Open the JSON file and load its contents into memory
@@ -353,10 +861,11 @@ class Movies:
                 data = json.load(f)
 
             movies = []
+            table = MovieTable()
 
             # Convert each JSON entry into a Movie object
             for movie_id, movie_data in data.items():
-                movies.append(Movies.from_json(movie_id, movie_data))
+                movies.append(Movies.from_json(movie_id, movie_data, table))
 
             # Return the full list of Movie objects
             return movies
@@ -367,61 +876,61 @@ class Movies:
     @staticmethod
     def get_movie_by_id(movie_id):
         """Get a movie by its ID."""
-        movies = Movies.get_cached_movies()
-        for movie in movies:
-            if movie.id == movie_id:
-                return movie
-        return None
+        return Movies.get_cached_catalog()[1].get(movie_id)
+
+    @staticmethod
+    def get_movies_by_ids(movie_ids):
+        """Get movies for a batch of IDs, in the same order, with None for unknown IDs."""
+        movies_by_id = Movies.get_cached_catalog()[1]
+        return [movies_by_id.get(movie_id) for movie_id in movie_ids]
         
     
     def get_reviews(self):
             """Get reviews for this movie."""
-            movie_reviews = Review.get_reviews_for_movie(self.id)
-            reviews = []
-
-            for user_email, review in movie_reviews.items():
-                user = User.get_user(user_email);
-                if user is not None:
-                    preferred_name = User.get_user(user_email).get_displayName()
-                    review["user_displayName"] = preferred_name
-                    reviews.append(review)
-
-            return reviews
+            return Review.get_display_reviews(self.id)
     
     def get_recomendations(user):
-        recommendations = []
-        for genre in user.get_preferred_genres() :
-            movies = Movies.search_movies_by_genre(genre)
-            sorted_movies = sorted(movies, key=lambda m: m.rating, reverse=True)
-            recommendations.extend(sorted_movies[:Movies.RECOMMENDATION_LIMIT])
-        return recommendations
+        """Movies best matching the user's genre and cast weights, excluding ones they reviewed."""
+        preferences = user.get_preferences()
+        reviewed = Review.load_user_reviews(user) or {}
+        # Show RECOMMENDATION_LIMIT movies per preferred genre
+        limit = Movies.RECOMMENDATION_LIMIT * max(1, len(preferences.get_genre_weights()))
+        return Movies.get_cached_recommender().recommend(
+            preferences.get_genre_weights(), preferences.get_cast_weights(), limit, exclude=reviewed)
         
-    def get_user_review(self, user):
-        user_reviews = Review.load_user_reviews(user)
-        if (user_reviews != None) :
-            return user_reviews.get(self.id)
-        return None
-    
-    def delete_user_review(self, user):
+    def get_similar_movies(self):
+        """Movies most often liked by the people who reviewed this one."""
+        neighbours = Review.get_cached_similarity().neighbours(self.id)
+        movies = Movies.get_movies_by_ids(movie_id for movie_id, _ in neighbours[:Movies.SIMILAR_LIMIT])
+        return [movie for movie in movies if movie is not None]
+
+    @staticmethod
+    def get_also_liked(user):
+        """Movies liked by users who liked the same movies as this user."""
+        ratings = {movie_id: review['rating'] for movie_id, review in Review.load_user_reviews(user).items()}
+        movie_ids = Review.get_cached_similarity().recommend(
+            ratings, Movies.RECOMMENDATION_LIMIT, min_rating=Movies.LIKED_RATING)
+        return [movie for movie in Movies.get_movies_by_ids(movie_ids) if movie is not None]
+
+    @staticmethod
+    def annotate_user_reviews(movies, user):
+        """Wrap movies in MovieViews carrying the user's review of each, if any."""
         user_reviews = Review.load_user_reviews(user)
-        if (user_reviews != None) :
-            user_reviews.pop(self.id, None)
-        print(user_reviews)
- 
+        reviewed = user_reviews.keys() & {movie.id for movie in movies}
+        return [MovieView(movie, user_reviews[movie.id] if movie.id in reviewed else None) for movie in movies]
+
     #To display the user's own reviews on the dashboard
     @staticmethod
     def get_user_reviews(user):
 
         # Load reviews.json
         user_reviews = Review.load_user_reviews(user)
-        print("usrReviews")
-        print(user_reviews)
         # Load movies
         reviews = []
 
-        # Loop through movie IDs in reviews.json
-        for movie_id, review in user_reviews.items():
-            movie = Movies.get_movie_by_id(movie_id)
+        # Resolve every reviewed movie in one batch of dictionary lookups
+        movies = Movies.get_movies_by_ids(user_reviews.keys())
+        for movie, review in zip(movies, user_reviews.values()):
             reviews.append({
                 'movie': movie,
                 'recommendation_score': review['recommendation_score'],
@@ -433,7 +942,6 @@ class Movies:
                     'written_review': review['written_review']
                 })
         return reviews
- 
-    
-    
 
+
+Metrics.gauge('cache.search', Movies.get_search_cache_stats)
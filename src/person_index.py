@@ -0,0 +1,80 @@
+from array import array
+
+from text_search import ngrams, normalize_name
+
+
+class PersonIndex:
+    """Index of the people credited on the catalog's movies.
+
+    Every distinct normalized name has an id, and for each role the ids
+    map to the positions of the movies the person is credited on in that
+    role. Names can be looked up exactly, or by substring through trigram
+    postings that are verified against the name.
+    """
+
+    ROLES = ('actor', 'actress', 'director')
+    # Roles searched by default, matching Movies.cast
+    CAST_ROLES = ('actor', 'actress')
+
+    def __init__(self, movies):
+        """Build the index over the people of the given list of Movies."""
+        self._names = []
+        self._name_ids = {}
+        # {role: {name_id: positions}}
+        self._postings = {role: {} for role in PersonIndex.ROLES}
+        self._grams = {}
+
+        for position, movie in enumerate(movies):
+            for role, names in (('actor', movie.actors), ('actress', movie.actresses),
+                                ('director', movie.directors)):
+                role_postings = self._postings[role]
+                for name in names or []:
+                    name_id = self._name_id(normalize_name(name))
+                    postings = role_postings.get(name_id)
+                    if postings is None:
+                        postings = role_postings[name_id] = array('i')
+                    if not postings or postings[-1] != position:
+                        postings.append(position)
+
+    def __len__(self):
+        return len(self._names)
+
+    def _name_id(self, name):
+        """Return the id of a normalized name, adding it if needed."""
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            name_id = self._name_ids[name] = len(self._names)
+            self._names.append(name)
+            for gram in ngrams(name):
+                self._grams.setdefault(gram, array('i')).append(name_id)
+        return name_id
+
+    def exact(self, name):
+        """Return the ids of names equal to name once normalized."""
+        name_id = self._name_ids.get(normalize_name(name))
+        return [] if name_id is None else [name_id]
+
+    def containing(self, query):
+        """Return the ids of names containing query, using the rarest query n-gram."""
+        query = normalize_name(query)
+        query_grams = ngrams(query)
+        if not query_grams:
+            # Too short for the n-gram index, check every name directly
+            return [i for i, name in enumerate(self._names) if query in name]
+
+        postings = [self._grams.get(gram) for gram in query_grams]
+        if any(posting is None for posting in postings):
+            return []
+        rarest = min(postings, key=len)
+        return [i for i in rarest if query in self._names[i]]
+
+    def positions(self, name_ids, roles=CAST_ROLES):
+        """Return the set of positions of the movies crediting any of the names in any of the roles."""
+        positions = set()
+        for role in roles:
+            role_postings = self._postings[role]
+            for name_id in name_ids:
+                postings = role_postings.get(name_id)
+                if postings is not None:
+                    positions.update(postings)
+        return positions
@@ -3,22 +3,57 @@
 Standalone script to process IMDB data files and convert them to JSON.
 Run this once before starting the Flask app.
 
-Usage: python process_imdb.py
+Usage: python process_imdb.py [--incremental] [--json] [--download | --stream] [--base-url URL]
+
+With --incremental, only movies that changed since the last run are
+rebuilt and running apps are told which ids changed. Movies are saved to
+the columnar catalog data/movies.bin; --json also writes data/movies.json
+for debugging.
+
+--download fetches the dumps that changed into data/imdb first. --stream
+does the same but parses each dump while it downloads, so the network
+and the parser work at the same time.
 """
 
+from IMDBDownloader import IMDBDownloader
 from movies import Movies
+import argparse
 import sys
 
 def main():
+    parser = argparse.ArgumentParser(description="Process IMDB data files into the movie catalog.")
+    parser.add_argument('--incremental', action='store_true',
+                        help="apply only the changes since the last run")
+    parser.add_argument('--json', action='store_true',
+                        help="also export data/movies.json for debugging")
+    fetch = parser.add_mutually_exclusive_group()
+    fetch.add_argument('--download', action='store_true',
+                       help="download changed IMDb dumps before processing")
+    fetch.add_argument('--stream', action='store_true',
+                       help="download changed IMDb dumps and process them as they arrive")
+    parser.add_argument('--base-url', default=IMDBDownloader.IMDB_BASE_URL,
+                        help="server to download the dumps from")
+    args = parser.parse_args()
+
     print("Starting IMDB data processing...")
     print("This may take a few minutes depending on file size...")
     
     try:
-        result = Movies._process_imdb_data()
+        streams = None
+        downloader = IMDBDownloader(Movies.IMDB_DIR, base_url=args.base_url)
+        if args.download:
+            downloader.download_imdb_files()
+        elif args.stream:
+            streams = downloader.stream_imdb_files()
+
+        if args.incremental:
+            result = Movies._refresh_imdb_data(args.json, streams)
+        else:
+            result = Movies._process_imdb_data(args.json, streams)
         
         if result:
             print("\n✓ IMDB data processing completed successfully!")
-            print(f"  Movies saved to: data/movies.json")
+            print(f"  Movies saved to: data/movies.bin")
         else:
             print("\n✗ No movies were processed. Check file paths and permissions.")
             sys.exit(1)
@@ -0,0 +1,94 @@
+import numpy as np
+
+from movie_index import weighted_rating
+
+
+class Recommender:
+    """Scores the whole catalog against a user's genre and cast weights.
+
+    Every movie is a sparse feature vector over genres and cast members.
+    Genres are few, so they are kept as a dense movie x genre matrix;
+    cast members are many, so each one maps to the positions of its
+    movies (CSR layout). A user's score for a movie is the dot product of
+    their weights with that vector, computed for all movies at once.
+
+    This replaces ranking each preferred genre separately and merging the
+    top of each list: one pass scores genres and cast together, and a
+    movie in several preferred genres ranks above one in a single genre.
+    Movies.get_cached_recommender builds one per catalog snapshot, so it
+    is rebuilt whenever the catalog is reloaded.
+    """
+
+    # Weighted rating is added at this scale so it only breaks ties
+    # between movies with the same preference score
+    TIEBREAK = 1e-4
+
+    def __init__(self, movies):
+        """Build the feature matrices for the given list of Movies."""
+        self._movies = list(movies)
+        self._positions = {movie.id: position for position, movie in enumerate(self._movies)}
+        self._tiebreak = np.array([weighted_rating(movie) for movie in self._movies], dtype=np.float64)
+        self._tiebreak *= Recommender.TIEBREAK
+
+        self._genre_ids = {}
+        genre_rows = []
+        genre_cols = []
+        person_movies = {}
+        for position, movie in enumerate(self._movies):
+            for genre in movie.genres or []:
+                genre_rows.append(position)
+                genre_cols.append(self._genre_ids.setdefault(genre, len(self._genre_ids)))
+            for name in set(movie.cast or []):
+                person_movies.setdefault(name, []).append(position)
+
+        self._genres = np.zeros((len(self._movies), len(self._genre_ids)), dtype=np.float32)
+        self._genres[genre_rows, genre_cols] = 1.0
+
+        self._person_ids = {}
+        offsets = [0]
+        for name, positions in person_movies.items():
+            self._person_ids[name] = len(offsets) - 1
+            offsets.append(offsets[-1] + len(positions))
+        self._person_offsets = np.array(offsets, dtype=np.int64)
+        self._person_movies = np.fromiter(
+            (position for positions in person_movies.values() for position in positions),
+            dtype=np.int32, count=offsets[-1])
+
+    def scores(self, genre_weights, cast_weights):
+        """Return every movie's preference score for the given {name: weight} dicts."""
+        genre_vector = np.zeros(len(self._genre_ids), dtype=np.float32)
+        for genre, weight in genre_weights.items():
+            genre_id = self._genre_ids.get(genre)
+            if genre_id is not None:
+                genre_vector[genre_id] = weight
+        scores = (self._genres @ genre_vector).astype(np.float64)
+
+        for name, weight in cast_weights.items():
+            person_id = self._person_ids.get(name)
+            if person_id is not None:
+                start, end = self._person_offsets[person_id], self._person_offsets[person_id + 1]
+                scores[self._person_movies[start:end]] += weight
+        return scores
+
+    def recommend(self, genre_weights, cast_weights, limit, exclude=()):
+        """Return up to limit Movies with the highest positive score, best first.
+
+        Movies whose id is in exclude, such as ones the user already
+        reviewed, are never returned.
+        """
+        scores = self.scores(genre_weights, cast_weights)
+        matched = scores > 0
+        for movie_id in exclude:
+            position = self._positions.get(movie_id)
+            if position is not None:
+                matched[position] = False
+
+        candidates = np.flatnonzero(matched)
+        if not len(candidates) or limit <= 0:
+            return []
+        ranked = scores[candidates] + self._tiebreak[candidates]
+        if len(candidates) > limit:
+            top = np.argpartition(-ranked, limit - 1)[:limit]
+            candidates, ranked = candidates[top], ranked[top]
+        order = np.argsort(-ranked, kind='stable')
+        return [self._movies[position] for position in candidates[order]]
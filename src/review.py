@@ -1,10 +1,32 @@
-import json
+import bisect
+import hashlib
 import os
+import threading
+import time
+from collaborative import ItemSimilarity
+from metrics import Metrics
+from review_store import ReviewStore
 from user import User
 class Review:
+    # reviews.json is the compacted snapshot, later changes are in the journal
     REVIEWS_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'reviews.json')
+    JOURNAL_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'reviews.journal')
+    # Guards the review caches below. They are only read without it: every
+    # change publishes a new dict or list instead of modifying one in place
+    _lock = threading.RLock()
+    _store = None
     _cache = None
-    _user_review_cache = None
+    # Per-user index {email: {movie_id: review}} of every user's reviews.
+    # A change replaces the user's inner dict, so it is read without the lock
+    _user_reviews = None
+    _similarity_cache = None
+    # Reviews of a movie with display names resolved, kept for a short time
+    # as {movie_id: (built_at, reviews, page_keys)}
+    _movie_reviews_cache = {}
+    MOVIE_REVIEWS_CACHE_SECONDS = 30
+    MOVIE_REVIEWS_CACHE_SIZE = 1024
+    REVIEWS_PAGE_SIZE = 10
+    MAX_REVIEWS_PAGE_SIZE = 50
     @staticmethod
     def save_review(user_email, movie,
         recommendation_score, acting_score,
@@ -37,47 +59,95 @@ class Review:
             "written_review": written_review
         }
 
-        # Load all existing reviews from the JSON cache
-        reviews = Review.load_cached_reviews()
-
-        # If this movie has no reviews yet, create an empty entry for it
-        if movie_id not in reviews:
-            reviews[movie_id] = {}
+        store = Review.get_store()
+        with Review._lock:
+            # Load all existing reviews from the cache
+            Review.load_cached_reviews()
 
-        # Prevent users from submitting more than one review per movie
-        if user_email in reviews[movie_id]:
+            # Save the review under the movie and user by appending it to the
+            # review journal, which also updates the cached reviews. The
+            # store refuses a second review per movie, checking under the
+            # journal's lock so two server processes cannot both accept one
+            stored, records = store.put_new(movie_id, user_email, review_data)
+            Review._store_refreshed(records)
+            if stored:
+                Review._review_changed(user_email, movie_id, review_data)
+        # fsync and compaction happen after the lock is released, so
+        # readers of the caches never wait for the disk
+        store.maintain()
+        if not stored:
             return False, "You have already submitted a review for this movie."
 
-        # Save the review under the movie and user
-        reviews[movie_id][user_email] = review_data
-
-        # Write the updated review data back to the JSON file
-        Review.dump_reviews(reviews)
-
-        # Refresh the user's review list so the dashboard updates immediately
-        user.load_reviews_from_disk()
-
         # Return success status and confirmation message
         return True, "Review submitted successfully."
 
+    @staticmethod
+    def get_store():
+        """Get the journaled review store."""
+        if Review._store is None:
+            with Review._lock:
+                if Review._store is None:
+                    Review._store = ReviewStore(Review.REVIEWS_FILE, Review.JOURNAL_FILE)
+        return Review._store
 
-    
     @staticmethod
-    def dump_reviews(reviews):
-        # Open the reviews.json file in write mode so the updated
-        # reviews dictionary can be saved to persistent storage.
-        print("in dumo reviews")
-        print(reviews)
-        with open(Review.REVIEWS_FILE, "w") as f:
-            # Convert the Python dictionary into JSON and write it
-            # to the file with indentation for readability.
-            json.dump(reviews, f, indent=4)
+    def _review_changed(user_email, movie_id, review):
+        """Bring the derived caches up to date with one saved (or, with review None, deleted) review."""
+        Review._movie_reviews_cache.pop(movie_id, None)
+        index = Review._user_reviews
+        if index is not None:
+            user_reviews = {key: value for key, value in index.get(user_email, {}).items() if key != movie_id}
+            if review is not None:
+                user_reviews[movie_id] = review
+            index[user_email] = user_reviews
 
-        # Output the current state of the reviews to the console
-        # for debugging and verification during development.
+        # Refresh the "also liked" neighbours of the movies this review touches
+        if Review._similarity_cache is not None:
+            Review._similarity_cache.update(user_email, movie_id, None if review is None else review["rating"])
 
-        
+    @staticmethod
+    def refresh_reviews():
+        """Pick up reviews saved or deleted by other server processes."""
+        # Checked without the lock, as this runs on every request
+        if Review._cache is None or not Review.get_store().changed():
+            return
+        with Review._lock:
+            Review._store_refreshed(Review.get_store().refresh())
 
+    @staticmethod
+    def _store_refreshed(records):
+        """Bring the derived caches up to date with records from ReviewStore.refresh."""
+        if records is None:
+            # The store was reloaded, so every derived cache is rebuilt
+            Review._cache = Review.get_store().load()
+            Review._user_reviews = None
+            Review._movie_reviews_cache = {}
+            Review._similarity_cache = None
+            return
+        for record in records:
+            Review._review_changed(record['user_email'], record['movie_id'], record.get('review'))
+
+    @staticmethod
+    def remove_review(user_email, movie_id):
+        """Delete one user's review of a movie and save the change."""
+        store = Review.get_store()
+        with Review._lock:
+            store.delete(movie_id, user_email)
+            Review._review_changed(user_email, movie_id, None)
+        store.maintain()
+
+    @staticmethod
+    def get_cached_similarity():
+        """Get the item-item similarity model, built from all reviews on first use."""
+        similarity = Review._similarity_cache
+        if similarity is None:
+            # Built with the lock held so no review change is missed meanwhile
+            with Review._lock:
+                if Review._similarity_cache is None:
+                    with Metrics.timer('cache.similarity.build'):
+                        Review._similarity_cache = ItemSimilarity(Review.load_cached_reviews())
+                similarity = Review._similarity_cache
+        return similarity
 
     @staticmethod
     def get_reviews_for_movie(movie_id):
@@ -85,48 +155,120 @@ class Review:
         reviews = Review.load_cached_reviews()
         movies_reviews = reviews.get(movie_id, {})
         return movies_reviews
+
+    @staticmethod
+    def get_display_reviews(movie_id):
+        """Get the reviews of a movie with each reviewer's display name, highest rated first."""
+        return Review._get_display_entry(movie_id)[0]
+
+    @staticmethod
+    def _page_key(user_email, review):
+        """Sort key of a review in a movie's review pages.
+
+        Ties on rating are broken by a digest of the reviewer's email, so
+        the key is unique without revealing the email in page cursors.
+        """
+        reviewer = hashlib.blake2b(user_email.encode('utf-8'), digest_size=8).hexdigest()
+        return -(review.get('rating') or 0.0), reviewer
+
+    @staticmethod
+    def _get_display_entry(movie_id):
+        """Get (display reviews, their page keys) of a movie, from the cache if it is fresh."""
+        now = time.monotonic()
+        cached = Review._movie_reviews_cache.get(movie_id)
+        if cached is not None and now - cached[0] < Review.MOVIE_REVIEWS_CACHE_SECONDS:
+            Metrics.count('cache.movie_reviews.hit')
+            return cached[1:]
+        Metrics.count('cache.movie_reviews.miss')
+
+        stored = Review.load_cached_reviews().get(movie_id)
+        movie_reviews = stored or {}
+        # One lookup for all reviewers instead of loading each user
+        names = User.get_display_names(movie_reviews.keys())
+        entries = sorted(
+            (Review._page_key(user_email, review), dict(review, user_displayName=names[user_email]))
+            for user_email, review in movie_reviews.items() if user_email in names)
+        keys = [key for key, _ in entries]
+        reviews = [review for _, review in entries]
+
+        with Review._lock:
+            if len(Review._movie_reviews_cache) >= Review.MOVIE_REVIEWS_CACHE_SIZE:
+                Review._movie_reviews_cache = {
+                    key: value for key, value in Review._movie_reviews_cache.items()
+                    if now - value[0] < Review.MOVIE_REVIEWS_CACHE_SECONDS}
+            # A review saved while this list was built makes it stale, so
+            # only publish it if the movie's reviews are unchanged
+            if Review.load_cached_reviews().get(movie_id) is stored:
+                Review._movie_reviews_cache[movie_id] = (now, reviews, keys)
+        return reviews, keys
+
+    @staticmethod
+    def get_reviews_page(movie_id, cursor=None, limit=REVIEWS_PAGE_SIZE):
+        """Get up to limit display reviews of a movie, highest rated first, following cursor.
+
+        Returns (reviews, next_cursor), next_cursor being None on the last
+        page. A cursor names the last review of the previous page rather
+        than a position, so reviews added or removed between requests do
+        not make pages skip or repeat reviews. An empty or malformed cursor
+        starts at the first page.
+        """
+        reviews, keys = Review._get_display_entry(movie_id)
+        start = 0
+        if cursor:
+            try:
+                rating, reviewer = cursor.split(':', 1)
+                start = bisect.bisect_right(keys, (-float(rating), reviewer))
+            except ValueError:
+                pass
+        end = start + limit
+        if end >= len(reviews):
+            return reviews[start:], None
+        last_rating, last_reviewer = keys[end - 1]
+        return reviews[start:end], f"{-last_rating!r}:{last_reviewer}"
     
     @staticmethod
     def load_cached_reviews():
         # If the cache is empty, it means reviews haven't been loaded yet
         if Review._cache is None:
-            print("Loading reviews from disk...")   # Debug message to show when disk loading happens
-
-            # Load reviews from the JSON file and store them in the cache
-            Review.load_reviews()
+            with Review._lock:
+                if Review._cache is None:
+                    # Load reviews from the JSON file and store them in the cache
+                    with Metrics.timer('cache.reviews.build'):
+                        Review.load_reviews()
 
         # Return the cached reviews (either freshly loaded or previously stored)
         return Review._cache
 
+    @staticmethod
+    def get_cached_user_reviews():
+        """Get the {email: {movie_id: review}} index of every user's reviews, built on first use."""
+        index = Review._user_reviews
+        if index is None:
+            # Built with the lock held so no review change is missed meanwhile
+            with Review._lock:
+                if Review._user_reviews is None:
+                    with Metrics.timer('cache.user_reviews.build'):
+                        index = {}
+                        for movie_id, movie_reviews in Review.load_cached_reviews().items():
+                            for email, review in movie_reviews.items():
+                                index.setdefault(email, {})[movie_id] = review
+                        Review._user_reviews = index
+                index = Review._user_reviews
+        return index
+
     @staticmethod
     def load_user_reviews(user):
-        """Load reviews submitted by this user."""
-        if Review._user_review_cache is None:
-            Review.load_reviews()
-            user_reviews = {}
-
-            # Loop through every movie and its associated reviews
-            for movie_id, movie_reviews in Review._cache.items():
-                # If this user has written a review for the movie, store it
-                if user.get_email() in movie_reviews:
-                    user_reviews[movie_id] = movie_reviews[user.get_email()]
-
-            # Cache the user's reviews so they can be accessed quickly later
-            Review._user_review_cache = user_reviews
-        return Review._user_review_cache
+        """Load reviews submitted by this user as {movie_id: review}.
+
+        Takes no lock: the dict returned is never changed afterwards.
+        """
+        return Review.get_cached_user_reviews().get(user.get_email(), {})
     
     @staticmethod
     def load_reviews():
-    # Ensure file exists
-        print("loading from disk reviews")
-        if not os.path.exists(Review.REVIEWS_FILE):
-            with open(Review.REVIEWS_FILE, "w") as f:
-                json.dump({}, f, indent=4)
+        # Replay the snapshot and journal; the store keeps this dict current
+        Review._cache = Review.get_store().load()
 
-        # Load existing reviews
-        with open(Review.REVIEWS_FILE, "r") as f:
-            Review._cache = json.load(f)
 
-    @staticmethod
-    def delete_movie_review(movie_id): 
-        Review._user_review_cache.pop(movie_id, None)
\ No newline at end of file
+Metrics.gauge('cache.user_reviews.size', lambda: len(Review._user_reviews or ()))
+Metrics.gauge('cache.movie_reviews.size', lambda: len(Review._movie_reviews_cache))
@@ -0,0 +1,318 @@
+import atexit
+from contextlib import contextmanager
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows runs a single server process, so no file lock is needed
+    fcntl = None
+
+
+class ReviewStore:
+    """Review storage as a JSON snapshot plus an append-only journal.
+
+    Every change is appended to the journal as one JSON line, a "put"
+    with the full review or a "delete", and written through to the OS
+    straight away, so a crashed process loses nothing. fsync is batched:
+    the journal is synced once FSYNC_BATCH records are pending, and a
+    background thread syncs whatever is pending every FSYNC_INTERVAL
+    seconds, so a power failure loses at most the last FSYNC_INTERVAL
+    seconds of writes even when the server goes idle after them. Once the
+    journal holds COMPACT_RECORDS records it is folded into a new snapshot.
+
+    Loading reads the snapshot and replays the journal. A torn last line
+    from a crash mid-write is dropped. Replaying is idempotent, so a
+    crash between writing the snapshot and truncating the journal is also
+    safe.
+
+    Several server processes can share one store: writes and compaction
+    hold an exclusive lock on the journal file, and refresh replays what
+    other processes appended since the last load or refresh. put_new
+    checks for an existing review and writes under that lock, so only one
+    process can add a user's first review of a movie.
+
+    put syncs and compacts as due by itself. put_new and delete leave
+    that to maintain, so a caller can write while holding its own lock
+    and then sync and compact after releasing it.
+    """
+
+    FSYNC_BATCH = 32
+    FSYNC_INTERVAL = 1.0
+    COMPACT_RECORDS = 10000
+
+    def __init__(self, snapshot_file, journal_file):
+        """Create a store over the given snapshot and journal paths."""
+        self._snapshot_file = snapshot_file
+        self._journal_file = journal_file
+        self._lock = threading.Lock()
+        self._reviews = None
+        self._journal = None
+        # Process that opened self._journal; a forked child opens its own
+        self._journal_pid = None
+        # Bytes of the journal replayed so far, and the snapshot they apply to
+        self._offset = 0
+        self._snapshot_stamp = None
+        self._journal_records = 0
+        self._pending = 0
+        self._synced_at = time.monotonic()
+        # Process running the flush thread, which forks do not inherit
+        self._flusher_pid = None
+        atexit.register(self.sync)
+
+    def load(self):
+        """Return the {movie_id: {user_email: review}} dict recovered from disk.
+
+        The same dict is kept up to date by put and delete until refresh
+        reloads the store. The inner per-movie dicts are replaced rather
+        than modified, so a reader holding one never sees it change.
+        """
+        with self._lock:
+            if self._reviews is None:
+                self._recover()
+            return self._reviews
+
+    def _open_journal(self):
+        """Return this process's journal file, opening it if needed.
+
+        A process forked after the store was loaded, like a serve.py
+        worker, must not use the file it inherited: flock locks an open
+        file, which the parent and every other worker share, so it would
+        not keep them out.
+        """
+        if self._journal is None or self._journal_pid != os.getpid():
+            self._journal = open(self._journal_file, 'ab')
+            self._journal_pid = os.getpid()
+        return self._journal
+
+    @contextmanager
+    def _file_lock(self):
+        """Hold the journal's lock, shared with other processes using the store."""
+        journal = self._open_journal()
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(journal.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(journal.fileno(), fcntl.LOCK_UN)
+
+    def _stamp(self):
+        """Identify the current snapshot file, which compaction replaces."""
+        try:
+            stat = os.stat(self._snapshot_file)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _replay(self, reviews):
+        """Apply the journal from self._offset on and return the records applied.
+
+        Called with the file lock held, so an incomplete last line can only
+        be left by a crash and is truncated.
+        """
+        records = []
+        with open(self._journal_file, 'rb') as f:
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                ReviewStore._apply(reviews, record)
+                records.append(record)
+                self._offset += len(line)
+        # Cut off anything after the last complete record
+        if self._offset != os.path.getsize(self._journal_file):
+            print(f"Truncating torn review journal at byte {self._offset}")
+            os.truncate(self._journal_file, self._offset)
+        return records
+
+    def _recover(self):
+        with self._file_lock():
+            self._reload()
+
+    def _reload(self):
+        """Read the snapshot and the whole journal, with the file lock held."""
+        reviews = {}
+        if os.path.exists(self._snapshot_file):
+            with open(self._snapshot_file, 'r', encoding='utf-8') as f:
+                reviews = json.load(f)
+        self._snapshot_stamp = self._stamp()
+        self._offset = 0
+        self._journal_records = len(self._replay(reviews))
+        self._reviews = reviews
+
+    def _catch_up(self):
+        """Apply what other processes wrote since the last load or refresh, with the file lock held.
+
+        Returns the records applied, or None if another process compacted
+        the store and it was reloaded.
+        """
+        if self._stamp() != self._snapshot_stamp:
+            self._reload()
+            return None
+        records = self._replay(self._reviews)
+        self._journal_records += len(records)
+        return records
+
+    def changed(self):
+        """Check, without taking any lock, if the files changed since the last load or refresh.
+
+        Cheap enough to run on every request; a change seen late is picked
+        up by the next call.
+        """
+        if self._reviews is None:
+            return True
+        try:
+            size = os.path.getsize(self._journal_file)
+        except OSError:
+            return True
+        return size != self._offset or self._stamp() != self._snapshot_stamp
+
+    def refresh(self):
+        """Apply the changes other processes made since the last load or refresh.
+
+        Returns the journal records applied, which include this process's
+        own writes again, or None if the whole store was reloaded because
+        another process compacted it; load then returns a new dict.
+        """
+        with self._lock:
+            if self._reviews is None:
+                self._recover()
+                return None
+            if not self.changed():
+                return []
+            with self._file_lock():
+                return self._catch_up()
+
+    @staticmethod
+    def _apply(reviews, record):
+        movie_id, user_email = record['movie_id'], record['user_email']
+        movie_reviews = reviews.get(movie_id, {})
+        if record['op'] == 'put':
+            reviews[movie_id] = {**movie_reviews, user_email: record['review']}
+        elif user_email in movie_reviews:
+            reviews[movie_id] = {email: review for email, review in movie_reviews.items() if email != user_email}
+
+    def _append(self, record):
+        if self._reviews is None:
+            self._recover()
+        with self._file_lock():
+            self._write(record)
+        self._written()
+
+    def _write(self, record):
+        """Apply a record and append it to the journal, with the file lock held."""
+        ReviewStore._apply(self._reviews, record)
+        line = json.dumps(record).encode('utf-8') + b'\n'
+        caught_up = os.fstat(self._journal.fileno()).st_size == self._offset
+        self._journal.write(line)
+        self._journal.flush()
+        if caught_up:
+            # Nothing from other processes to replay before this record
+            self._offset += len(line)
+
+    def _written(self):
+        """Count a record written by _write."""
+        self._journal_records += 1
+        self._pending += 1
+        if self._flusher_pid != os.getpid():
+            self._flusher_pid = os.getpid()
+            threading.Thread(target=self._flush_periodically, name="review journal flusher", daemon=True).start()
+
+    def _maintain(self):
+        """Sync the journal and compact it as due."""
+        if self._pending >= ReviewStore.FSYNC_BATCH or \
+                time.monotonic() - self._synced_at >= ReviewStore.FSYNC_INTERVAL:
+            self._sync()
+        if self._journal_records >= ReviewStore.COMPACT_RECORDS:
+            self._compact()
+
+    def put(self, movie_id, user_email, review):
+        """Store one user's review of a movie."""
+        with self._lock:
+            self._append({'op': 'put', 'movie_id': movie_id, 'user_email': user_email, 'review': review})
+            self._maintain()
+
+    def put_new(self, movie_id, user_email, review):
+        """Store a user's review of a movie unless they already reviewed it.
+
+        Other processes' changes are applied first, and the check and the
+        write both happen with the file lock held. Returns (stored,
+        records), records being what refresh would have returned for
+        those changes. Call maintain afterwards.
+        """
+        with self._lock:
+            if self._reviews is None:
+                self._recover()
+            with self._file_lock():
+                records = self._catch_up()
+                if user_email in self._reviews.get(movie_id, {}):
+                    return False, records
+                self._write({'op': 'put', 'movie_id': movie_id, 'user_email': user_email, 'review': review})
+            self._written()
+            return True, records
+
+    def delete(self, movie_id, user_email):
+        """Remove one user's review of a movie; call maintain afterwards."""
+        with self._lock:
+            self._append({'op': 'delete', 'movie_id': movie_id, 'user_email': user_email})
+
+    def maintain(self):
+        """Sync the journal if a batch is due and compact it if it has grown large enough."""
+        with self._lock:
+            self._maintain()
+
+    def _sync(self):
+        if self._pending:
+            os.fsync(self._open_journal().fileno())
+        self._pending = 0
+        self._synced_at = time.monotonic()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(ReviewStore.FSYNC_INTERVAL)
+            with self._lock:
+                self._sync()
+
+    def sync(self):
+        """fsync any journal records written since the last sync."""
+        with self._lock:
+            self._sync()
+
+    def _compact(self):
+        with self._file_lock():
+            # Take in other processes' writes so the snapshot has them too
+            if self._stamp() != self._snapshot_stamp:
+                print("Review snapshot was compacted by another process, skipping compaction")
+                self._journal_records = 0
+                return
+            self._replay(self._reviews)
+
+            temp_file = self._snapshot_file + '.tmp'
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(self._reviews, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_file, self._snapshot_file)
+            self._snapshot_stamp = self._stamp()
+
+            # Truncate in place, other processes keep appending to the same file
+            self._journal.truncate(0)
+            self._offset = 0
+        self._journal_records = 0
+        self._pending = 0
+        self._synced_at = time.monotonic()
+
+    def compact(self):
+        """Fold the journal into a new snapshot and start an empty journal."""
+        with self._lock:
+            if self._reviews is None:
+                self._recover()
+            self._compact()
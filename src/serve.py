@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Production server for the Movie Matcher app.
+
+The movie catalog and every index built from it are loaded once in the
+parent process, which then forks the worker processes. The workers share
+those pages copy-on-write instead of each loading its own copy, and all
+of them accept connections from one listening socket.
+
+The parent also checks for a catalog saved by a later process_imdb.py
+run. It loads the new catalog and builds its indexes, then forks a new
+set of workers and lets the old ones finish their requests and exit, so
+the workers keep sharing a single copy. Workers never reload the catalog
+themselves, which would give each of them a private copy.
+
+Usage: python serve.py [--host HOST] [--port PORT] [--workers N]
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+from main import app
+from movies import Movies
+from review import Review
+from user import User
+
+# Seconds to wait for workers to exit on shutdown before killing them
+SHUTDOWN_TIMEOUT = 10
+# Seconds between checks for exited workers
+POLL_INTERVAL = 0.2
+
+
+def warm_caches():
+    """Load the catalog, its indexes, the reviews and the users."""
+    start = time.perf_counter()
+    Movies.get_cached_movies()
+    Movies.get_cached_genres()
+    Movies.get_cached_index()
+    Movies.get_cached_recommender()
+    Movies.get_cached_suggester()
+    Review.load_cached_reviews()
+    Review.get_cached_similarity()
+    Review.get_cached_user_reviews()
+    User.get_store()
+    print(f"Loaded catalog and indexes in {time.perf_counter() - start:.2f}s")
+
+
+def freeze_heap():
+    """Move everything loaded so far out of the collector's reach.
+
+    Collections in the workers then do not write to (and copy) the pages
+    they share with the parent.
+    """
+    gc.unfreeze()
+    gc.collect()
+    gc.freeze()
+
+
+def run_worker(listener):
+    """Serve requests from the shared listening socket until terminated."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # The parent swaps the catalog by replacing the workers
+    Movies.disable_catalog_watcher()
+    host, port = listener.getsockname()[:2]
+    server = make_server(host, port, app, fd=listener.fileno())
+    # Finish the request in progress, then exit; shutdown waits for
+    # serve_forever, so it cannot run in this thread
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    try:
+        server.serve_forever()
+    finally:
+        os._exit(0)
+
+
+def spawn_worker(listener):
+    """Fork one worker process and return its pid."""
+    pid = os.fork()
+    if pid == 0:
+        run_worker(listener)
+    return pid
+
+
+def stop_workers(workers):
+    """Terminate the workers, killing any that do not exit in time."""
+    for pid in workers:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    # Only these workers are reaped, others may still be serving
+    workers = set(workers)
+    deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+    while workers and time.monotonic() < deadline:
+        workers = {pid for pid in workers if os.waitpid(pid, os.WNOHANG)[0] == 0}
+        if workers:
+            time.sleep(0.05)
+    for pid in workers:
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1', help="address to listen on")
+    parser.add_argument('--port', type=int, default=8000, help="port to listen on")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="worker processes")
+    args = parser.parse_args()
+
+    listener = socket.create_server((args.host, args.port), backlog=1024)
+    listener.set_inheritable(True)
+
+    warm_caches()
+    freeze_heap()
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, stop)
+
+    workers = set()
+    try:
+        for _ in range(max(1, args.workers)):
+            workers.add(spawn_worker(listener))
+        print(f"Serving on http://{args.host}:{listener.getsockname()[1]} with {len(workers)} workers", flush=True)
+        next_check = time.monotonic() + Movies.CATALOG_WATCH_INTERVAL
+        while True:
+            for pid in list(workers):
+                exited, status = os.waitpid(pid, os.WNOHANG)
+                if exited:
+                    # Replace a worker that crashed
+                    print(f"Worker {pid} exited with status {status}, restarting")
+                    workers.discard(pid)
+                    workers.add(spawn_worker(listener))
+
+            if time.monotonic() >= next_check:
+                try:
+                    swapped = Movies.refresh_catalog()
+                except Exception as e:
+                    # Keep the workers on the current catalog and try again later
+                    print(f"Error reloading the catalog: {e}")
+                    swapped = False
+                if swapped:
+                    # Nothing in this process still uses the old snapshot
+                    Movies.forget_previous_catalog()
+                    freeze_heap()
+                    old_workers = workers
+                    workers = {spawn_worker(listener) for _ in old_workers}
+                    stop_workers(old_workers)
+                    print(f"Replaced {len(old_workers)} workers to serve the new catalog", flush=True)
+                next_check = time.monotonic() + Movies.CATALOG_WATCH_INTERVAL
+            time.sleep(POLL_INTERVAL)
+    except KeyboardInterrupt:
+        print("Shutting down")
+    finally:
+        # A second signal must not cut the shutdown short
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        stop_workers(workers)
+        listener.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import threading
+
+from metrics import Metrics
+
+
+class SharedCache:
+    """A lazily built value shared by every thread of the server.
+
+    The value is built on first use with single-flight loading: when many
+    threads ask for it at once, one builds it while the others wait and
+    then get the same result. It is never modified in place. A new value
+    is built completely and then published with one assignment, so a
+    reader always sees a whole, consistent snapshot without taking a lock.
+
+    A cache can be tied to a key, such as the catalog snapshot an index
+    was built from, and is rebuilt when asked for with a different key.
+    When set publishes a value for a new key, the value it replaces stays
+    available for its old key until forget_previous, so requests that
+    started on the old snapshot can finish on it.
+    """
+
+    def __init__(self, build, name=None):
+        """Create an empty cache whose value is made by calling build(key).
+
+        With a name, hits, misses and build times are recorded in Metrics
+        as cache.<name>.hit, cache.<name>.miss and cache.<name>.build.
+        """
+        self._build = build
+        self._name = name
+        if name is not None:
+            self._hit_metric = f"cache.{name}.hit"
+            self._miss_metric = f"cache.{name}.miss"
+            self._build_metric = f"cache.{name}.build"
+        self._lock = threading.Lock()
+        # (key, value) published together so they always match
+        self._entry = None
+        self._previous = None
+
+    def get(self, key=None):
+        """Return the value for key, building it if it is missing or was built for another key."""
+        entry = self._entry
+        if entry is None or entry[0] is not key:
+            previous = self._previous
+            if previous is not None and previous[0] is key:
+                entry = previous
+            else:
+                with self._lock:
+                    entry = self._entry
+                    if entry is None or entry[0] is not key:
+                        entry = self._entry = (key, self.build(key))
+                        if self._name is not None:
+                            Metrics.count(self._miss_metric)
+                        return entry[1]
+        if self._name is not None:
+            Metrics.count(self._hit_metric)
+        return entry[1]
+
+    def peek(self):
+        """Return the current value without building it, or None."""
+        entry = self._entry
+        return None if entry is None else entry[1]
+
+    def build(self, key=None):
+        """Build a value for key without publishing it."""
+        if self._name is None:
+            return self._build(key)
+        with Metrics.timer(self._build_metric):
+            return self._build(key)
+
+    def set(self, value, key=None):
+        """Publish a new value, keeping the current one as the previous value."""
+        with self._lock:
+            self._previous = self._entry
+            self._entry = (key, value)
+
+    def forget_previous(self):
+        """Drop the value replaced by the last set."""
+        self._previous = None
+
+    def invalidate(self):
+        """Drop the value so the next get builds it again."""
+        with self._lock:
+            self._entry = None
+            self._previous = None
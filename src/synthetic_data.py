@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Synthetic IMDb-scale dataset for benchmarks and offline testing.
+
+Writes the five IMDb dumps (title.basics, title.ratings, name.basics,
+title.principals and title.crew .tsv.gz) with the real columns, and a
+users.json and reviews.json in the formats the app migrates from, so the
+whole pipeline can run without network access or real data.
+
+The numbers are shaped like IMDb's rather than uniform: most titles are
+not movies or have few votes, a few people appear in many titles, and
+reviews go mostly to popular movies. Titles and names are built from
+common words so the search filter mixes in benchmark.py have matches.
+The same seed always writes the same files.
+
+Every synthetic user's password is SYNTHETIC_PASSWORD.
+
+Usage: python synthetic_data.py DIRECTORY [--titles N] [--users N] [--reviews-per-user N] [--seed N]
+"""
+import argparse
+import bisect
+import gzip
+import itertools
+import json
+import os
+import random
+import time
+
+import imdb_pipeline
+from user import User
+
+SYNTHETIC_PASSWORD = 'Synthetic123'
+
+GENRES = ['Drama', 'Comedy', 'Action', 'Thriller', 'Romance', 'Horror', 'Documentary', 'Crime',
+          'Adventure', 'Animation', 'Family', 'Fantasy', 'Mystery', 'Sci-Fi', 'Biography', 'War']
+# Title types and how often they occur; only 'movie' makes it into the catalog
+TITLE_TYPES = (('movie', 45), ('short', 15), ('tvEpisode', 25), ('tvSeries', 8), ('video', 7))
+# Principal categories and how often they occur; actor, actress and director are the cast
+CATEGORIES = (('actor', 30), ('actress', 22), ('director', 10), ('writer', 12), ('producer', 10),
+              ('self', 8), ('composer', 4), ('cinematographer', 4))
+PRINCIPALS_PER_TITLE = 8
+TITLE_WORDS = ['the', 'night', 'star', 'love', 'man', 'day', 'dark', 'last', 'city', 'house', 'war', 'king',
+               'lost', 'girl', 'blood', 'life', 'world', 'dead', 'secret', 'story', 'long', 'road', 'summer',
+               'shadow', 'fire', 'heart', 'river', 'stone', 'dream', 'golden', 'silent', 'wild']
+FIRST_NAMES = ['John', 'Mary', 'James', 'Anna', 'Robert', 'Linda', 'Michael', 'Susan', 'David', 'Karen',
+               'Lee', 'Maria', 'Daniel', 'Sarah', 'Paul', 'Laura', 'Mark', 'Emma', 'Peter', 'Julia',
+               'Thomas', 'Ann', 'George', 'Grace', 'Kenji', 'Priya', 'Ahmed', 'Sofia', 'Ivan', 'Chen']
+LAST_NAMES = ['Smith', 'Johnson', 'Brown', 'Lee', 'Garcia', 'Miller', 'Davis', 'Wilson', 'Anderson',
+              'Taylor', 'Thomas', 'Moore', 'Martin', 'Jackson', 'White', 'Harris', 'Clark', 'Lewis',
+              'Walker', 'Young', 'Allen', 'King', 'Wright', 'Scott', 'Green', 'Baker', 'Adams', 'Nelson',
+              'Hill', 'Campbell', 'Mitchell', 'Roberts', 'Carter', 'Phillips', 'Evans', 'Turner']
+# The values each question of the review form (review_modal.html) posts
+REVIEW_SCORES = (4, 8, 12, 16, 20)
+# One line of written review text, repeated for longer reviews
+REVIEW_TEXT = "A synthetic review of a synthetic movie. "
+
+
+def _weighted(choices):
+    """Split (value, weight) pairs into values and cumulative weights for random.choices."""
+    values = [value for value, _ in choices]
+    return values, list(itertools.accumulate(weight for _, weight in choices))
+
+
+def _votes(rng):
+    """Vote count of a title: log-uniform between 5 and a million, so about half pass MIN_VOTES."""
+    return int(10 ** rng.uniform(0.7, 6))
+
+
+def _popular(rng, count, skew=3):
+    """Index below count, with low indexes far more likely, like the busiest actors."""
+    return int(count * rng.random() ** skew)
+
+
+def title(i, rng):
+    """A title made of common words, numbered so titles stay unique."""
+    words = rng.sample(TITLE_WORDS, rng.randint(1, 4))
+    return ' '.join(words).title() + f" {i}"
+
+
+def person_name(i):
+    """The i-th person's name; first and last names repeat, so partial cast searches match many people."""
+    first = FIRST_NAMES[i % len(FIRST_NAMES)]
+    last = LAST_NAMES[(i // len(FIRST_NAMES)) % len(LAST_NAMES)]
+    suffix = i // (len(FIRST_NAMES) * len(LAST_NAMES))
+    return f"{first} {last}" + (f" {suffix + 1}" if suffix else '')
+
+
+def random_review(rng):
+    """A review in the format Review.save_review stores, with scores the review form can post."""
+    scores = [rng.choice(REVIEW_SCORES) for _ in range(5)]
+    return {
+        "recommendation_score": scores[0],
+        "acting_score": scores[1],
+        "quality_score": scores[2],
+        "rewatch_score": scores[3],
+        "engagement": scores[4],
+        "rating": sum(scores) / 10,
+        "written_review": REVIEW_TEXT * rng.randint(1, 10),
+    }
+
+
+def _dump(directory, filename, header, rows):
+    with gzip.open(os.path.join(directory, filename), 'wt', encoding='utf-8', compresslevel=1) as f:
+        f.write('\t'.join(header) + '\n')
+        f.writelines('\t'.join(row) + '\n' for row in rows)
+
+
+def write_imdb_dumps(directory, titles, seed=0):
+    """Write the five IMDb dumps for the given number of titles into directory.
+
+    Returns {tconst: votes} of the movies that qualify for the catalog, for
+    write_reviews.
+    """
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    people = titles
+    title_types, type_weights = _weighted(TITLE_TYPES)
+    categories, category_weights = _weighted(CATEGORIES)
+
+    # Drawn up front to know which titles reach the catalog: rated movies
+    # with enough votes that are not adult and have a year
+    types = rng.choices(title_types, cum_weights=type_weights, k=titles)
+    votes = [_votes(rng) for _ in range(titles)]
+    adult = [rng.random() < 0.01 for _ in range(titles)]
+    years = [str(rng.randint(1920, 2025)) if rng.random() > 0.02 else imdb_pipeline.NULL for _ in range(titles)]
+
+    def basics():
+        for i in range(titles):
+            runtime = str(rng.randint(70, 180) if types[i] == 'movie' else rng.randint(5, 60))
+            name = title(i, rng)
+            yield (f"tt{i:07d}", types[i], name, name, '1' if adult[i] else '0', years[i], '\\N',
+                   runtime if rng.random() > 0.05 else '\\N', ','.join(rng.sample(GENRES, rng.randint(1, 3))))
+
+    def principals():
+        for i in range(titles):
+            for order in range(1, PRINCIPALS_PER_TITLE + 1):
+                category = rng.choices(categories, cum_weights=category_weights)[0]
+                yield f"tt{i:07d}", str(order), f"nm{_popular(rng, people):07d}", category, '\\N', '\\N'
+
+    _dump(directory, 'title.basics.tsv.gz',
+          ['tconst', 'titleType', 'primaryTitle', 'originalTitle', 'isAdult', 'startYear', 'endYear',
+           'runtimeMinutes', 'genres'], basics())
+    _dump(directory, 'title.ratings.tsv.gz', ['tconst', 'averageRating', 'numVotes'],
+          ((f"tt{i:07d}", f"{min(10.0, max(1.0, rng.gauss(6.3, 1.3))):.1f}", str(votes[i])) for i in range(titles)))
+    _dump(directory, 'title.principals.tsv.gz', ['tconst', 'ordering', 'nconst', 'category', 'job', 'characters'],
+          principals())
+    _dump(directory, 'name.basics.tsv.gz',
+          ['nconst', 'primaryName', 'birthYear', 'deathYear', 'primaryProfession', 'knownForTitles'],
+          ((f"nm{i:07d}", person_name(i), str(rng.randint(1900, 2005)), '\\N', 'actor', f"tt{i % titles:07d}")
+           for i in range(people)))
+    _dump(directory, 'title.crew.tsv.gz', ['tconst', 'directors', 'writers'],
+          ((f"tt{i:07d}", f"nm{_popular(rng, people):07d}", f"nm{_popular(rng, people):07d}") for i in range(titles)))
+
+    return {f"tt{i:07d}": votes[i] for i in range(titles)
+            if types[i] == 'movie' and votes[i] >= imdb_pipeline.MIN_VOTES
+            and not adult[i] and years[i] != imdb_pipeline.NULL}
+
+
+def user_email(i):
+    return f"user{i}@example.com"
+
+
+def write_users(path, users, seed=0):
+    """Write users.json with the given number of users, each with a few preferred genres and cast members."""
+    rng = random.Random(seed)
+    records = {}
+    for i in range(users):
+        email = user_email(i)
+        genres = {genre: 1.0 + 0.2 * rng.randint(0, 5) for genre in rng.sample(GENRES, rng.randint(1, 4))}
+        cast = {person_name(_popular(rng, 5000)): 0.2 * rng.randint(1, 5) for _ in range(rng.randint(0, 20))}
+        records[email] = {
+            "password": User.hash_password(SYNTHETIC_PASSWORD, email),
+            "displayName": f"User {i}",
+            "preferences": {"genres": genres, "cast": cast},
+        }
+    with open(path, 'w') as f:
+        json.dump(records, f)
+
+
+def write_reviews(path, movie_votes, users, reviews_per_user, seed=0):
+    """Write reviews.json with about reviews_per_user reviews per user, mostly of well-voted movies.
+
+    Returns the number of reviews written.
+    """
+    rng = random.Random(seed)
+    movie_ids = list(movie_votes)
+    cum_votes = list(itertools.accumulate(movie_votes.values()))
+    reviews = {}
+    count = 0
+    for i in range(users if movie_ids else 0):
+        email = user_email(i)
+        for _ in range(rng.randint(0, 2 * reviews_per_user)):
+            # A movie picked in proportion to its votes
+            movie_id = movie_ids[bisect.bisect(cum_votes, rng.random() * cum_votes[-1])]
+            movie_reviews = reviews.setdefault(movie_id, {})
+            if email not in movie_reviews:
+                movie_reviews[email] = random_review(rng)
+                count += 1
+    with open(path, 'w') as f:
+        json.dump(reviews, f)
+    return count
+
+
+def write_dataset(directory, titles, users, reviews_per_user, seed=0):
+    """Write the IMDb dumps to directory/imdb and users.json and reviews.json to directory.
+
+    Returns a summary of what was written.
+    """
+    movie_votes = write_imdb_dumps(os.path.join(directory, 'imdb'), titles, seed)
+    write_users(os.path.join(directory, 'users.json'), users, seed)
+    reviews = write_reviews(os.path.join(directory, 'reviews.json'), movie_votes, users, reviews_per_user, seed)
+    return {'titles': titles, 'movies': len(movie_votes), 'users': users, 'reviews': reviews, 'seed': seed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('directory', help="directory to write to; the dumps go to its imdb folder")
+    parser.add_argument('--titles', type=int, default=100000, help="rows in title.basics (10k to 1M)")
+    parser.add_argument('--users', type=int, default=10000, help="users in users.json")
+    parser.add_argument('--reviews-per-user', type=int, default=10, help="average reviews per user")
+    parser.add_argument('--seed', type=int, default=0, help="random seed")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    summary = write_dataset(args.directory, args.titles, args.users, args.reviews_per_user, args.seed)
+    print(f"Wrote {summary['titles']} titles ({summary['movies']} catalog movies), {summary['users']} users "
+          f"and {summary['reviews']} reviews to {args.directory} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+import unicodedata
+
+NGRAM_SIZE = 3
+
+
+def fold(text):
+    """Case-fold text and strip accents, so "Amélie" and "AMELIE" compare equal."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def normalize_name(name):
+    """Accent- and case-fold a person's name and collapse its whitespace."""
+    return ' '.join(fold(name).split())
+
+
+def ngrams(text, size=NGRAM_SIZE):
+    """Return the distinct n-grams of the given text."""
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def word_ngrams(text, size=NGRAM_SIZE):
+    """Return the distinct n-grams of the words of text, padded so word starts and ends count."""
+    grams = set()
+    for word in text.split():
+        grams.update(ngrams(f' {word} ', size))
+    return grams
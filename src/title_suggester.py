@@ -0,0 +1,91 @@
+import bisect
+
+import numpy as np
+
+from movie_index import weighted_rating
+from text_search import fold, word_ngrams
+
+
+class TitleSuggester:
+    """Title autocomplete over the movie catalog.
+
+    Titles are accent- and case-folded. Prefix matches come from the folded
+    titles kept in sorted order, which works as a flattened prefix trie:
+    the titles starting with a prefix are one contiguous range, found with
+    two bisections. When prefixes give too few results, titles sharing
+    enough word trigrams with the query are added, so typos still find a
+    movie. Prefix matches are ranked by the weighted rating used by search;
+    fuzzy matches by the number of shared trigrams, then weighted rating.
+    """
+
+    # Fraction of the query's trigrams a title must contain to be a fuzzy match
+    FUZZY_MATCH = 0.4
+
+    def __init__(self, movies):
+        """Build the prefix and trigram indexes for the given list of Movies."""
+        self._movies = list(movies)
+        weighted = [weighted_rating(movie) for movie in self._movies]
+        ranked = sorted(range(len(self._movies)), key=lambda p: -weighted[p])
+        self._rank = np.empty(len(self._movies), dtype=np.int64)
+        self._rank[ranked] = np.arange(len(self._movies))
+        self._ranked = np.array(ranked, dtype=np.int64)
+
+        titles = [fold(movie.title) for movie in self._movies]
+        order = sorted(range(len(titles)), key=titles.__getitem__)
+        self._sorted_titles = [titles[p] for p in order]
+        # Rank of the movie at each place of the sorted titles
+        self._sorted_ranks = self._rank[np.array(order, dtype=np.int64)]
+
+        postings = {}
+        for position, title in enumerate(titles):
+            for gram in word_ngrams(title):
+                postings.setdefault(gram, []).append(position)
+        self._grams = {gram: np.array(positions, dtype=np.int32) for gram, positions in postings.items()}
+
+    def __len__(self):
+        return len(self._movies)
+
+    def _best(self, ranks, limit):
+        """Return the positions of the limit best ranks, best first."""
+        if len(ranks) > limit:
+            ranks = np.partition(ranks, limit - 1)[:limit]
+        return self._ranked[np.sort(ranks)].tolist()
+
+    def _prefix_matches(self, query, limit):
+        lo = bisect.bisect_left(self._sorted_titles, query)
+        hi = bisect.bisect_left(self._sorted_titles, query + '\U0010ffff', lo)
+        return self._best(self._sorted_ranks[lo:hi], limit)
+
+    def _fuzzy_matches(self, query, limit):
+        query_grams = word_ngrams(query)
+        needed = len(query_grams) * TitleSuggester.FUZZY_MATCH
+        postings = [self._grams[gram] for gram in query_grams if gram in self._grams]
+        if not postings or len(postings) < needed:
+            return []
+        # Number of the query's trigrams in each title, counted over the
+        # postings alone rather than the whole catalog
+        candidates, shared = np.unique(np.concatenate(postings), return_counts=True)
+        enough = shared >= needed
+        matched, shared = candidates[enough], shared[enough]
+        # Most shared trigrams first, then best rank, packed into one sort key
+        count = len(self._movies)
+        keys = (len(query_grams) - shared) * count + self._rank[matched]
+        if len(keys) > limit:
+            keys = np.partition(keys, limit - 1)[:limit]
+        return self._ranked[np.sort(keys) % count].tolist()
+
+    def suggest(self, query, limit=10):
+        """Return up to limit Movies whose title matches query, prefix matches first."""
+        query = fold(query).strip()
+        if not query or limit <= 0:
+            return []
+        positions = self._prefix_matches(query, limit)
+        if len(positions) < limit:
+            seen = set(positions)
+            # Ask for extra fuzzy matches in case some are prefix matches already
+            for position in self._fuzzy_matches(query, limit + len(positions)):
+                if position not in seen:
+                    positions.append(position)
+                    if len(positions) == limit:
+                        break
+        return [self._movies[p] for p in positions]
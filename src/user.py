@@ -1,14 +1,25 @@
 import json
 import os
+import threading
+from collections import OrderedDict
+from metrics import Metrics
 from user_preferences import UserPreferences
+from user_store import UserStore
 
 class User:
     """User class for authentication and registration management."""
     
+    USERS_DB_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'users.db')
+    # Only read once, to migrate its users into USERS_DB_FILE
     USERS_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'users.json')
     REVIEWS_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'reviews.json')
  
-    _users_cache = None
+    _users_lock = threading.Lock()
+    _store = None
+    # Hydrated Users of recently active users {email: User}, least recently
+    # used first
+    _users_cache = OrderedDict()
+    USER_CACHE_SIZE = 1000
     def __init__(self, email, password=None, displayName=None, preferences=None):
         """Initialize a User instance."""
         self.__email = email
@@ -48,42 +59,41 @@ class User:
         return True, "Password is strong."
     
     @staticmethod
-    def load_users():
-        if (User._users_cache == None):
-            User.load_users_from_disk()
-        return User._users_cache
-        
-        
+    def get_store():
+        """Get the user store, migrating users.json into it on first use."""
+        if User._store is None:
+            with User._users_lock:
+                if User._store is None:
+                    User._store = UserStore(User.USERS_DB_FILE, User.USERS_FILE)
+        return User._store
 
     @staticmethod
-    def load_users_from_disk():   
-        """Load all users from the JSON file."""
-        if not os.path.exists(User.USERS_FILE):
-            with open(User.USERS_FILE, "w") as f:
-                json.dump({}, f, indent=4)
-        with open(User.USERS_FILE, 'r') as f:
-                User._users_cache = json.load(f)
-        return User._users_cache
-    
-    
+    def refresh_users():
+        """Drop the cached users if another server process changed any user."""
+        if User._store is not None and User._store.changed():
+            with User._users_lock:
+                User._users_cache = OrderedDict()
+
+    @staticmethod
+    def _cache_user(user):
+        """Keep a hydrated User, dropping the least recently used one."""
+        with User._users_lock:
+            User._users_cache[user.get_email()] = user
+            User._users_cache.move_to_end(user.get_email())
+            if len(User._users_cache) > User.USER_CACHE_SIZE:
+                User._users_cache.popitem(last=False)
+
     @staticmethod
     def save_user(user):
-        """Save users to the JSON file."""
-        users = User.load_users()
-        for user_email, record in user.to_dict().items(): 
-            users[user_email] = record
-        
-        os.makedirs(os.path.dirname(User.USERS_FILE), exist_ok=True)
-        with open(User.USERS_FILE, 'w') as f:
-            json.dump(users, f, indent=4)
-    
+        """Save the user's row in the user store."""
+        for user_email, record in user.to_dict().items():
+            User.get_store().put(user_email, record)
+        User._cache_user(user)
+
     @staticmethod
     def email_exists(email):
         """Check if an email is already registered."""
-        users = User.load_users()
-        if (users == None) :
-            return None
-        return email in users
+        return email in User._users_cache or User.get_store().exists(email)
     
     def to_dict(self):
         """Convert the User instance to a dictionary for JSON storage."""
@@ -112,26 +122,29 @@ class User:
             return False, message
         
         # Hash password and save user
-        hashed_password = User.__encrypt_password(password, email)
+        hashed_password = User.hash_password(password, email)
         preferences = UserPreferences.set_registeration_rating(preferences)
         new_user = User(email, hashed_password, displayName, preferences)
         
-        User.save_user(new_user)
+        # Inserting only if the email is free also catches a registration
+        # for the same email that got past email_exists at the same time
+        for user_email, record in new_user.to_dict().items():
+            if not User.get_store().add(user_email, record):
+                return False, "Email already registered."
+        User._cache_user(new_user)
         return True, "User registered successfully."
     
     @staticmethod
     def authenticate_user(email, password):
         """Authenticate a user by email and password."""
-        users = User.load_users()
+        user = User.get_user(email)
         
-        if email not in users:
+        if user is None:
             return False, "Invalid username/password."
         
-        stored_password_hash = users[email]['password']
-        print("Stored password hash:", stored_password_hash)
+        stored_password_hash = user.__password
         
-        encrypted_password = User.__encrypt_password(password, email)
-        print("Encrypted password:", encrypted_password)
+        encrypted_password = User.hash_password(password, email)
 
         if encrypted_password == stored_password_hash:
             return True, "Login successful."
@@ -141,9 +154,21 @@ class User:
     @staticmethod
     def get_user(email):
         """Get user data by email."""
-        users = User.load_users()
-        if email in users:
-            return User(email, users[email]['password'], users[email]['displayName'], users[email]['preferences'])
+        user = User._users_cache.get(email)
+        if user is not None:
+            Metrics.count('cache.users.hit')
+            return user
+        Metrics.count('cache.users.miss')
+        record = User.get_store().get(email)
+        if record is not None:
+            user = User(email, record['password'], record['displayName'], record['preferences'])
+            User._cache_user(user)
+            return user
+
+    @staticmethod
+    def get_display_names(emails):
+        """Get {email: display name} for the given emails, skipping unknown users."""
+        return User.get_store().display_names(emails)
     
     
 
@@ -168,11 +193,16 @@ class User:
 
         
     #creating my own hash function
-    def __encrypt_password(password: str, email : str) -> str:
+    @staticmethod
+    def hash_password(password: str, email : str) -> str:
+            """Return the stored form of a user's password."""
             data = (email + password + "moviematcher07").encode("utf-8")
             hash_value = 0
 
             for byte in data:
                 hash_value = (hash_value * 131 + byte) % (2**64)
 
-            return hex(hash_value)[2:]
\ No newline at end of file
+            return hex(hash_value)[2:]
+
+
+Metrics.gauge('cache.users.size', lambda: len(User._users_cache))
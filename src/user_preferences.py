@@ -27,21 +27,34 @@ class UserPreferences:
         return preference.to_dict()
     
     def update_preferences(self, data):
+        # Cached users are shared between requests, so the weights are
+        # updated on copies that replace the old dicts
         # Update genre preferences
         if "genres" in data:
-
-            for genre in data.get('genres'):
-                self.genres[genre] = self.genres.get(genre, 0) + UserPreferences.REVIEW_SCORE
+            genre = dict(self.genre)
+            for name in data.get('genres'):
+                genre[name] = genre.get(name, 0) + UserPreferences.REVIEW_SCORE
+            self.genre = genre
 
         # Update cast preferences
         if "cast" in data :
+            cast = dict(self.cast)
             for person in data.get('cast'):
-                self.cast[person] = self.cast.get(person, 0) + UserPreferences.REVIEW_SCORE
+                cast[person] = cast.get(person, 0) + UserPreferences.REVIEW_SCORE
+            self.cast = cast
 
 
         return self
 
     
+    def get_genre_weights(self):
+        """Return the {genre: weight} preferences."""
+        return self.genre
+
+    def get_cast_weights(self):
+        """Return the {cast member: weight} preferences."""
+        return self.cast
+
     def get_genres(self):
         return sorted(self.genre, key=self.genre.get, reverse=True)
     
@@ -0,0 +1,140 @@
+import json
+import os
+import sqlite3
+import threading
+
+
+class UserStore:
+    """User accounts in an SQLite database, one row per user.
+
+    Saving a user updates its own row instead of rewriting every account,
+    and lookups by email use the primary key, so both stay fast however
+    many users there are. The database runs in WAL mode, which lets the
+    server's processes read while one of them writes. Each process has
+    one connection, which its threads take turns to use.
+
+    A new database is filled from the old users.json, if there is one,
+    the first time it is opened. The JSON file is left in place.
+    """
+
+    # Bumped whenever the schema changes
+    SCHEMA_VERSION = 1
+    # Stay below SQLite's limit on the number of query parameters
+    LOOKUP_BATCH = 500
+
+    def __init__(self, db_file, json_file=None):
+        """Open the store at db_file, migrating users from json_file if it is new."""
+        self._db_file = db_file
+        self._json_file = json_file
+        self._lock = threading.Lock()
+        self._connection = None
+        # Process that opened the connection, which must not cross a fork
+        self._pid = None
+        # PRAGMA data_version when changed was last called
+        self._data_version = None
+        with self._lock:
+            self._migrate()
+
+    def _execute(self, sql, parameters=()):
+        """Run one statement and return all its rows."""
+        with self._lock:
+            return self._connect().execute(sql, parameters).fetchall()
+
+    def _connect(self):
+        """Return this process's connection, opening it if needed; the lock must be held."""
+        if self._connection is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self._db_file), exist_ok=True)
+            # Autocommit mode; transactions are begun explicitly
+            self._connection = sqlite3.connect(
+                self._db_file, timeout=30, isolation_level=None, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._pid = os.getpid()
+            self._data_version = None
+        return self._connection
+
+    def _migrate(self):
+        """Create the schema and import users.json on first use."""
+        connection = self._connect()
+        if connection.execute("PRAGMA user_version").fetchone()[0] >= UserStore.SCHEMA_VERSION:
+            return
+        # BEGIN IMMEDIATE so only one process runs the migration
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            if connection.execute("PRAGMA user_version").fetchone()[0] < UserStore.SCHEMA_VERSION:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS users ("
+                    "email TEXT PRIMARY KEY, password TEXT, display_name TEXT, preferences TEXT NOT NULL)")
+                users = {}
+                if self._json_file and os.path.exists(self._json_file):
+                    with open(self._json_file, 'r') as f:
+                        users = json.load(f)
+                    print(f"Migrating {len(users)} users from {self._json_file}")
+                connection.executemany(
+                    "INSERT OR REPLACE INTO users VALUES (?, ?, ?, ?)",
+                    (UserStore._row(email, record) for email, record in users.items()))
+                connection.execute(f"PRAGMA user_version={UserStore.SCHEMA_VERSION}")
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _row(email, record):
+        return (email, record.get('password'), record.get('displayName'),
+                json.dumps(record.get('preferences') or {}))
+
+    @staticmethod
+    def _record(row):
+        """Turn a (password, display_name, preferences) row into a users.json style record."""
+        password, display_name, preferences = row
+        return {"password": password, "displayName": display_name, "preferences": json.loads(preferences)}
+
+    def get(self, email):
+        """Return the record of the user with this email, or None."""
+        rows = self._execute("SELECT password, display_name, preferences FROM users WHERE email = ?", (email,))
+        return UserStore._record(rows[0]) if rows else None
+
+    def exists(self, email):
+        """Check if a user with this email exists."""
+        return bool(self._execute("SELECT 1 FROM users WHERE email = ?", (email,)))
+
+    def display_names(self, emails):
+        """Return {email: display name} for the emails that belong to users."""
+        emails = list(emails)
+        names = {}
+        for start in range(0, len(emails), UserStore.LOOKUP_BATCH):
+            batch = emails[start:start + UserStore.LOOKUP_BATCH]
+            names.update(self._execute(
+                f"SELECT email, display_name FROM users WHERE email IN ({','.join('?' * len(batch))})", batch))
+        return names
+
+    def add(self, email, record):
+        """Insert a new user; return False if the email is already taken."""
+        with self._lock:
+            cursor = self._connect().execute(
+                "INSERT OR IGNORE INTO users VALUES (?, ?, ?, ?)", UserStore._row(email, record))
+            return cursor.rowcount == 1
+
+    def put(self, email, record):
+        """Insert or update the user's row."""
+        self._execute(
+            "INSERT INTO users VALUES (?, ?, ?, ?) ON CONFLICT(email) DO UPDATE SET "
+            "password = excluded.password, display_name = excluded.display_name, "
+            "preferences = excluded.preferences",
+            UserStore._row(email, record))
+
+    def count(self):
+        """Return the number of users."""
+        return self._execute("SELECT COUNT(*) FROM users")[0][0]
+
+    def changed(self):
+        """Check if another process changed the users since the last call.
+
+        Also true on the first call with a new connection, such as after a fork.
+        """
+        with self._lock:
+            version = self._connect().execute("PRAGMA data_version").fetchone()[0]
+            changed = version != self._data_version
+            self._data_version = version
+            return changed